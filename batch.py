@@ -0,0 +1,156 @@
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from stats import Stats, NULL_STATS
+from cache import CompilationCache
+
+
+def collect_inputs(patterns, suffix=".ir"):
+    files = []
+    seen = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = []
+            for root, _, names in os.walk(pattern):
+                matches.extend(os.path.join(root, n) for n in names if n.endswith(suffix))
+            matches.sort()
+        elif glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern, recursive=True))
+        else:
+            matches = [pattern]
+        for path in matches:
+            if path not in seen:
+                seen.add(path)
+                files.append(path)
+    return files
+
+
+_caches = {}
+
+
+def worker_cache(directory, max_bytes):
+    # one cache object per worker process, so its size estimate survives
+    # between files
+    cache = _caches.get((directory, max_bytes))
+    if cache is None:
+        cache = _caches[directory, max_bytes] = CompilationCache(directory, max_bytes)
+    return cache
+
+
+def compile_one(path, collect_stats=False, trace_memory=False, cache_dir=None, cache_size=None, output=True,
+                **options):
+    from main import compile_file
+
+    stats = Stats(memory=trace_memory) if collect_stats else NULL_STATS
+    cache = worker_cache(cache_dir, cache_size) if cache_dir else None
+    before = cache.to_dict() if cache is not None else None
+    start = time.perf_counter()
+    result = {'file': path, 'output': None, 'error': None, 'instructions': 0}
+    try:
+        cfg, result['instructions'] = compile_file(path, stats=stats, cache=cache, **options)
+        if output:
+            with stats.timer('print'):
+                result['output'] = cfg.format()
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = time.perf_counter() - start
+    if cache is not None:
+        result['cache'] = {k: v - before[k] for k, v in cache.to_dict().items()}
+    if stats.enabled:
+        result['stats'] = stats.to_dict()
+    return result
+
+
+def output_path(out_dir, path, suffix=".out"):
+    rel = os.path.relpath(path)
+    if rel.startswith(os.pardir):
+        rel = os.path.abspath(path).lstrip(os.sep)
+    return os.path.join(out_dir, rel + suffix)
+
+
+def run_batch(files, jobs=None, chunksize=None, out_dir=None, jsonl=None, stats=NULL_STATS, cache=None,
+              quiet=False, **options):
+    jobs = jobs or os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1, len(files) // (jobs * 4))
+    if cache is not None:
+        options.update(cache_dir=cache.directory, cache_size=cache.max_bytes)
+    # quiet only silences stdout; -o and --jsonl still get the CFGs
+    output = not quiet or out_dir is not None or bool(jsonl)
+    worker = partial(compile_one, collect_stats=stats.enabled, trace_memory=stats.memory, output=output,
+                     **options)
+
+    stream = None
+    if jsonl == '-':
+        stream = sys.stdout
+    elif jsonl:
+        stream = open(jsonl, 'w')
+
+    errors = []
+    instructions = 0
+
+    def handle(result):
+        nonlocal instructions
+        instructions += result['instructions']
+        if result['error'] is not None:
+            errors.append((result['file'], result['error']))
+        if 'stats' in result:
+            stats.merge(result['stats'])
+        if cache is not None and 'cache' in result:
+            for key, count in result['cache'].items():
+                setattr(cache, key, getattr(cache, key) + count)
+        if stream is not None:
+            stream.write(json.dumps(result) + "\n")
+        if result['output'] is None:
+            return
+        if out_dir is not None:
+            target = output_path(out_dir, result['file'])
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'w') as f:
+                f.write(result['output'])
+                f.write("\n")
+        elif stream is None and not quiet:
+            print(f"### {result['file']}")
+            print(result['output'])
+
+    start = time.perf_counter()
+    try:
+        if jobs == 1:
+            for result in map(worker, files):
+                handle(result)
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                for result in executor.map(worker, files, chunksize=chunksize):
+                    handle(result)
+    finally:
+        if stream is not None and stream is not sys.stdout:
+            stream.close()
+    elapsed = time.perf_counter() - start
+
+    summary = {
+        'files': len(files),
+        'errors': len(errors),
+        'seconds': elapsed,
+        'files_per_second': len(files) / elapsed if elapsed else 0.0,
+        'instructions': instructions,
+        'instructions_per_second': instructions / elapsed if elapsed else 0.0,
+    }
+    if cache is not None:
+        summary['cache'] = cache.to_dict()
+    return summary, errors
+
+
+def print_summary(summary, errors, file=sys.stderr, cache_stats=False):
+    for path, error in errors:
+        print(f"Error processing file '{path}': {error}", file=file)
+    print(f"{summary['files']} files ({summary['errors']} failed) in {summary['seconds']:.2f}s: "
+          f"{summary['files_per_second']:.1f} files/s, "
+          f"{summary['instructions_per_second']:.0f} instructions/s", file=file)
+    if cache_stats and 'cache' in summary:
+        cache = summary['cache']
+        print(f"cache: {cache['hits']} hits, {cache['misses']} misses, "
+              f"{cache['stores']} stored, {cache['evictions']} evicted", file=file)
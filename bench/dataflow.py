@@ -0,0 +1,73 @@
+import sys
+import time
+from parser import Parser
+from passes import PassManager
+from dataflow import live_variables
+from bench.workload import generate_source, loop_source
+
+
+def best(fn, repeat=5):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def max_pressure(intervals):
+    # most SSA values live at any one position
+    events = sorted((pos, delta) for parts in intervals.values()
+                    for lo, hi in parts for pos, delta in ((lo, 1), (hi, -1)))
+    live = peak = 0
+    for _, delta in events:
+        live += delta
+        peak = max(peak, live)
+    return peak
+
+
+def name_liveness_sets(cfg):
+    # the same problem with set facts, for comparison with the bitsets
+    return live_variables(cfg.start, cfg.blocks, lambda b: b.succ, lambda b: b.pred,
+                          cfg.block_uses, cfg.block_defs, empty=frozenset(), rpo=cfg.get_domtree().rpo)
+
+
+def run(source):
+    cfg = Parser(source).parse()
+    pm = PassManager(cfg)
+    pm.analyses.get('frontiers')
+    cfg.compute_def_sites()
+    rows = [
+        ('names, bitsets',) + best(cfg.compute_liveness)[:1],
+        ('names, sets',) + best(lambda: name_liveness_sets(cfg))[:1],
+        ('pruned phis',) + best(lambda: cfg.count_phis("pruned"))[:1],
+    ]
+    pm.build_ssa("pruned")
+    pm.run_pipeline("sccp,gvn,licm,dce")
+    elapsed, (_, live_out) = best(cfg.compute_value_liveness)
+    rows.append(('SSA values',) + (elapsed,))
+    elapsed, intervals = best(lambda: cfg.compute_live_intervals(live_out))
+    rows.append(('live intervals',) + (elapsed,))
+    return len(cfg.blocks), rows, max_pressure(intervals)
+
+
+WORKLOADS = {
+    'diamonds': lambda size: generate_source(diamonds=size),
+    'loops': lambda size: loop_source(depth=3, invariants=size // 10, body=size // 10),
+}
+
+
+def main(argv):
+    sizes = [int(a) for a in argv[1:]] or [1000, 5000]
+    for shape, make in WORKLOADS.items():
+        for size in sizes:
+            blocks, rows, pressure = run(make(size))
+            print(f"=== {shape} {size}: {blocks} blocks, max pressure {pressure} ===")
+            for name, elapsed in rows:
+                print(f"{name:<16} {elapsed * 1e3:>9.2f} ms")
+            print()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,54 @@
+import random
+import sys
+import time
+from cfg import CFG
+from bench.workload import diamond_chain
+
+
+def set_based_dominates(cfg, a, b):
+    return a in cfg.dominators[b]
+
+
+def run(count, queries, seed=0):
+    blocks = diamond_chain(count)
+    cfg = CFG(blocks)
+    rng = random.Random(seed)
+    pairs = [(rng.choice(blocks), rng.choice(blocks)) for _ in range(queries)]
+
+    calls = 0
+    original = cfg.compute_dominators
+
+    def counted(*args, **kwargs):
+        nonlocal calls
+        calls += 1
+        return original(*args, **kwargs)
+
+    cfg.compute_dominators = counted
+
+    start = time.perf_counter()
+    cfg.get_domtree()
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for a, b in pairs:
+        cfg.get_domtree().dominates(a, b)
+    cached = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for a, b in pairs:
+        set_based_dominates(cfg, a, b)
+    walked = time.perf_counter() - start
+
+    return len(blocks), build, cached, walked, calls
+
+
+def main(argv):
+    queries = int(argv[1]) if len(argv) > 1 else 10000
+    print(f"{'blocks':>8} {'build':>10} {'domtree':>10} {'dom sets':>10} {'rebuilds':>9}")
+    for count in (100, 1000, 5000):
+        blocks, build, cached, walked, calls = run(count, queries)
+        print(f"{blocks:>8} {build:>10.4f} {cached:>10.4f} {walked:>10.4f} {calls:>9}")
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,65 @@
+import os
+import sys
+import tempfile
+import time
+from cfg import CFG
+from dot import save_dot
+from bench.workload import random_graph, populate
+
+
+def best(fn, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def graphviz_source(cfg, path):
+    with open(path, 'w') as f:
+        f.write(cfg.render().source)
+
+
+def run(count, directory):
+    # random graphs have long fall-through chains as well as back edges
+    cfg = CFG(populate(random_graph(count, max_succ=2)))
+    variants = {
+        'plain': {},
+        'max-lines=2': {'max_lines': 2, 'max_width': 40},
+        'collapse': {'collapse': True},
+        'domtree': {'cluster': 'domtree', 'max_lines': 2},
+        'loop': {'cluster': 'loop', 'collapse': True, 'max_lines': 2},
+    }
+    rows = []
+    path = os.path.join(directory, 'cfg.dot')
+    for name, options in variants.items():
+        elapsed = best(lambda: save_dot(cfg, path, **options))
+        rows.append((name, os.path.getsize(path), elapsed))
+    try:
+        import graphviz  # noqa: F401
+    except ImportError:
+        rows.append(('graphviz', None, None))
+    else:
+        elapsed = best(lambda: graphviz_source(cfg, path))
+        rows.append(('graphviz', os.path.getsize(path), elapsed))
+    return len(cfg.blocks), rows
+
+
+def main(argv):
+    sizes = [int(a) for a in argv[1:]] or [1000, 10000]
+    with tempfile.TemporaryDirectory() as directory:
+        for count in sizes:
+            blocks, rows = run(count, directory)
+            print(f"=== {blocks} blocks ===")
+            print(f"{'variant':<12} {'bytes':>10} {'ms':>9} {'kblocks/s':>10}")
+            for name, size, elapsed in rows:
+                if size is None:
+                    print(f"{name:<12} {'not installed':>20}")
+                    continue
+                print(f"{name:<12} {size:>10} {elapsed * 1e3:>9.2f} {blocks / elapsed / 1e3:>10.1f}")
+            print()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
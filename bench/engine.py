@@ -0,0 +1,59 @@
+import random
+import sys
+import time
+from parser import Parser
+from passes import PassManager
+from engine import FunctionCache, compile_cfg, interpret, input_names, call
+from bench.workload import generate_source
+
+
+def build(diamonds, seed=0):
+    cfg = Parser(generate_source(diamonds=diamonds, seed=seed)).parse()
+    pm = PassManager(cfg)
+    pm.build_ssa("pruned")
+    pm.run_pipeline("sccp,gvn,dce")
+    return cfg
+
+
+def best(fn, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(diamonds, calls):
+    cfg = build(diamonds)
+    names = input_names(cfg)
+    rng = random.Random(diamonds)
+    inputs = [{name: rng.randint(-50, 50) for name in names} for _ in range(calls)]
+
+    compile_time = best(lambda: compile_cfg(cfg), repeat=1)
+    fn = compile_cfg(cfg)
+    for args in inputs[:20]:
+        assert call(fn, args) == interpret(cfg, args), "compiled result differs from interpreter"
+
+    cache = FunctionCache()
+    cache.get(cfg)
+    lookup_time = best(lambda: cache.get(cfg))
+
+    interp_time = best(lambda: [interpret(cfg, args) for args in inputs]) / calls
+    positional = [[args[name] for name in fn.params] for args in inputs]
+    compiled_time = best(lambda: [fn(*args) for args in positional]) / calls
+    return cfg.instruction_count(), compile_time, lookup_time, interp_time, compiled_time
+
+
+def main(argv):
+    sizes = [int(a) for a in argv[1:]] or [10, 50, 200, 800]
+    calls = 200
+    print(f"{'instrs':>7} {'compile ms':>10} {'cache ms':>9} {'interp us':>10} {'compiled us':>12} {'speedup':>8}")
+    for diamonds in sizes:
+        instrs, compile_time, lookup_time, interp_time, compiled_time = run(diamonds, calls)
+        print(f"{instrs:>7} {compile_time * 1e3:>10.2f} {lookup_time * 1e3:>9.3f} {interp_time * 1e6:>10.1f} "
+              f"{compiled_time * 1e6:>12.2f} {interp_time / compiled_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main(sys.argv)
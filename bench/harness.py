@@ -0,0 +1,138 @@
+import argparse
+import gc
+import json
+import math
+import sys
+import time
+from cfg import CFG
+from parser import Parser, tokenize
+from passes import PassManager
+from bench.workload import SHAPES, generate_source, populate
+
+
+STAGES = ('tokenize', 'parse', 'compute_dominators', 'compute_frontiers',
+          'calculate_phi', 'rename', 'compute_ssa_uses', 'sccp', 'dce')
+
+SOURCE_SIZES = (50, 100, 200, 400, 800, 1600)
+SHAPE_SIZES = (250, 500, 1000, 2000, 4000, 8000)
+
+
+def run_stages(timings, code=None, blocks=None):
+    # runs the whole pipeline once, adding each stage's best time to timings
+    def timed(name, fn, *args):
+        gc.collect()
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        timings[name] = min(timings.get(name, elapsed), elapsed)
+        return result
+
+    if code is not None:
+        timed('tokenize', lambda: list(tokenize(code)))
+        cfg = timed('parse', lambda: Parser(code).parse())
+    else:
+        cfg = CFG(blocks)
+    size = cfg.instruction_count()
+    timed('compute_dominators', cfg.compute_dominators)
+    timed('compute_frontiers', cfg.compute_frontiers)
+    timed('calculate_phi', cfg.calculate_phi)
+    timed('rename', cfg.rename)
+    timed('compute_ssa_uses', cfg.compute_ssa_uses)
+    manager = PassManager(cfg)
+    timed('sccp', manager.sccp, cfg)
+    timed('dce', manager.dce, cfg)
+    return size
+
+
+def measure(shape, size, repeat, seed):
+    timings = {}
+    for _ in range(repeat):
+        if shape == 'source':
+            instrs = run_stages(timings, code=generate_source(diamonds=size, seed=seed))
+        else:
+            blocks = populate(SHAPES[shape](size, seed), seed=seed)
+            instrs = run_stages(timings, blocks=blocks)
+    return instrs, timings
+
+
+def fit_exponent(points):
+    # least-squares slope of log(time) against log(size): ~1 is linear,
+    # ~2 is quadratic
+    points = [(math.log(x), math.log(y)) for x, y in points if x > 0 and y > 0]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    var = sum((x - mean_x) ** 2 for x, _ in points)
+    if var == 0:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / var
+
+
+def run(shape, sizes, repeat, seed):
+    rows = []
+    for size in sizes:
+        instrs, timings = measure(shape, size, repeat, seed)
+        rows.append({'size': size, 'instructions': instrs, 'seconds': timings})
+    stages = [s for s in STAGES if s in rows[0]['seconds']]
+    exponents = {
+        stage: fit_exponent([(row['instructions'], row['seconds'][stage]) for row in rows])
+        for stage in stages
+    }
+    return {'shape': shape, 'stages': stages, 'rows': rows, 'exponents': exponents}
+
+
+def format_report(report, threshold):
+    stages = report['stages']
+    width = max(len(s) for s in stages)
+    lines = [f"=== {report['shape']} ==="]
+    lines.append(f"{'stage':<{width}} " + " ".join(f"{row['instructions']:>9}" for row in report['rows']) + "  exponent")
+    for stage in stages:
+        cells = " ".join(f"{row['seconds'][stage] * 1e3:>9.2f}" for row in report['rows'])
+        exponent = report['exponents'][stage]
+        if exponent is None:
+            verdict = "       -"
+        else:
+            verdict = f"{exponent:>8.2f}" + ("  SUPERLINEAR" if exponent > threshold else "")
+        lines.append(f"{stage:<{width}} {cells}  {verdict}")
+    lines.append("(columns are instruction counts, cells are milliseconds)")
+    return "\n".join(lines)
+
+
+def parse_args(argv):
+    arg_parser = argparse.ArgumentParser(description="Time every compiler stage over growing synthetic inputs.")
+    arg_parser.add_argument("--shape", action="append", choices=('source',) + tuple(SHAPES),
+                            help="workload to run (repeatable; default: all)")
+    arg_parser.add_argument("--sizes", type=lambda s: [int(n) for n in s.split(',')],
+                            help="comma-separated sizes (diamonds for 'source', blocks or depth otherwise)")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="runs per size; the best time is kept")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--threshold", type=float, default=1.3,
+                            help="flag stages whose fitted exponent is above this")
+    arg_parser.add_argument("--json", metavar="FILE", help="also write the raw timings as JSON")
+    return arg_parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    reports = []
+    for shape in args.shape or ('source',) + tuple(SHAPES):
+        sizes = args.sizes or (SOURCE_SIZES if shape == 'source' else SHAPE_SIZES)
+        report = run(shape, sizes, args.repeat, args.seed)
+        reports.append(report)
+        print(format_report(report, args.threshold))
+        print()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+    flagged = [(r['shape'], s) for r in reports for s, e in r['exponents'].items()
+               if e is not None and e > args.threshold]
+    for shape, stage in flagged:
+        print(f"warning: {stage} scales superlinearly on '{shape}'", file=sys.stderr)
+    return 1 if flagged else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,58 @@
+import sys
+import time
+from collections import Counter
+from parser import Parser
+from passes import PassManager
+from engine import interpret, compile_cfg, call
+from bench.workload import loop_source
+
+
+def build(source, passes):
+    cfg = Parser(source).parse()
+    pm = PassManager(cfg)
+    pm.build_ssa("pruned")
+    pm.run_pipeline(passes)
+    return cfg
+
+
+def executed(cfg, inputs):
+    # instructions run by the reference interpreter, phis included
+    visits = Counter()
+    result = interpret(cfg, inputs, visits=visits)
+    return result, sum(count * len(block.instr) for block, count in visits.items())
+
+
+def best(fn, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(depth, trips, invariants=4):
+    source = loop_source(depth=depth, invariants=invariants)
+    inputs = {'arg0': 3, 'arg1': 5, 'n': trips}
+    rows = []
+    for passes in ("sccp,gvn,dce", "sccp,gvn,licm,dce"):
+        cfg = build(source, passes)
+        result, count = executed(cfg, inputs)
+        fn = compile_cfg(cfg)
+        rows.append((passes, result, count, best(lambda: call(fn, inputs))))
+    assert rows[0][1] == rows[1][1], "licm changed the result"
+    return rows
+
+
+def main(argv):
+    trips = int(argv[1]) if len(argv) > 1 else 20
+    print(f"{'depth':>5} {'pipeline':<18} {'executed':>10} {'compiled ms':>12}")
+    for depth in (1, 2, 3):
+        rows = run(depth, trips)
+        for passes, _, count, elapsed in rows:
+            print(f"{depth:>5} {passes:<18} {count:>10} {elapsed * 1e3:>12.3f}")
+        print(f"{'':>5} {'reduction':<18} {1 - rows[1][2] / rows[0][2]:>10.1%}")
+
+
+if __name__ == '__main__':
+    main(sys.argv)
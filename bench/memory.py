@@ -0,0 +1,53 @@
+import sys
+import tracemalloc
+import ir
+
+
+def dict_backed(cls):
+    # same class with a per-instance __dict__, as the IR was before __slots__
+    return type(cls.__name__, (cls,), {})
+
+
+SLOTTED = {name: getattr(ir, name) for name in ('Var', 'BinOp', 'IfStmt', 'GotoStmt', 'ReturnStmt', 'PhiNode', 'BasicBlock')}
+DICT_BACKED = {name: dict_backed(cls) for name, cls in SLOTTED.items()}
+
+
+def build(classes, count):
+    Var, BinOp, IfStmt = classes['Var'], classes['BinOp'], classes['IfStmt']
+    GotoStmt, PhiNode, BasicBlock = classes['GotoStmt'], classes['PhiNode'], classes['BasicBlock']
+    blocks = []
+    for i in range(count):
+        block = BasicBlock(f"bb{i}", [])
+        if blocks:
+            block.add_pred(blocks[-1])
+            blocks[-1].add_succ(block)
+            phi = PhiNode("x")
+            phi.add_incoming("x", blocks[-1])
+            block.instr.append(phi)
+        block.instr.append(Var("x", BinOp("x", i, "+")))
+        block.instr.append(Var("y", BinOp("x", "y", "*")))
+        block.instr.append(IfStmt(BinOp("x", "y", "<"), GotoStmt(f"bb{i + 1}"), GotoStmt(f"bb{i + 1}")))
+        blocks.append(block)
+    blocks[-1].instr.append(classes['ReturnStmt']("x"))
+    return blocks
+
+
+def peak(classes, count):
+    tracemalloc.start()
+    blocks = build(classes, count)
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    instrs = sum(len(b.instr) for b in blocks)
+    return instrs, peak_bytes
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 20000
+    print(f"{'layout':>12} {'instrs':>8} {'peak (MB)':>10} {'bytes/instr':>12}")
+    for label, classes in (('__dict__', DICT_BACKED), ('__slots__', SLOTTED)):
+        instrs, peak_bytes = peak(classes, count)
+        print(f"{label:>12} {instrs:>8} {peak_bytes / 1e6:>10.2f} {peak_bytes / instrs:>12.1f}")
+
+
+if __name__ == '__main__':
+    main(sys.argv)
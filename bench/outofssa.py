@@ -0,0 +1,50 @@
+import sys
+import time
+from parser import Parser
+from passes import PassManager
+from stats import Stats
+from engine import interpret, input_names
+from bench.workload import generate_source, loop_source
+
+
+def build(source, passes="sccp,gvn,licm,dce"):
+    cfg = Parser(source).parse()
+    pm = PassManager(cfg)
+    pm.build_ssa("pruned")
+    pm.run_pipeline(passes)
+    return cfg
+
+
+def run(source):
+    cfg = build(source)
+    inputs = {name: 3 for name in input_names(cfg)}
+    expected = interpret(cfg, inputs, limit=10 ** 6)
+    stats = Stats()
+    start = time.perf_counter()
+    PassManager(cfg, stats).run_pass('out-of-ssa')
+    elapsed = time.perf_counter() - start
+    assert interpret(cfg, inputs, limit=10 ** 6) == expected, "out-of-ssa changed the result"
+    return elapsed, stats.counters
+
+
+WORKLOADS = {
+    'diamonds': lambda size: generate_source(diamonds=size),
+    'loops': lambda size: loop_source(depth=3, invariants=size // 10, body=size // 10),
+}
+
+
+def main(argv):
+    sizes = [int(a) for a in argv[1:]] or [100, 1000, 5000]
+    print(f"{'workload':<16} {'ms':>9} {'phi copies':>11} {'coalesced':>10} {'moves':>7} {'temps':>6} {'splits':>7}")
+    for shape, make in WORKLOADS.items():
+        for size in sizes:
+            elapsed, counters = run(make(size))
+            copies = counters['out-of-ssa.copies']
+            coalesced = counters['out-of-ssa.coalesced']
+            print(f"{shape + ' ' + str(size):<16} {elapsed * 1e3:>9.2f} {copies - counters['out-of-ssa.temps'] + coalesced:>11}"
+                  f" {coalesced:>10} {copies:>7} {counters['out-of-ssa.temps']:>6}"
+                  f" {counters['out-of-ssa.split_edges']:>7}")
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,39 @@
+import gc
+import sys
+import time
+from parser import Parser
+from passes import PassManager
+from bench.workload import if_chain_source, straight_line_source
+
+
+def build(source):
+    cfg = Parser(source).parse()
+    cfg.compute_dominators()
+    cfg.compute_frontiers()
+    cfg.calculate_phi()
+    cfg.rename()
+    cfg.compute_ssa_uses()
+    return cfg
+
+
+def run(source):
+    cfg = build(source)
+    size = sum(len(b.instr) for b in cfg.blocks)
+    gc.collect()
+    start = time.perf_counter()
+    PassManager(cfg).sccp(cfg)
+    return size, time.perf_counter() - start
+
+
+def main(argv):
+    sizes = [int(a) for a in argv[1:]] or [250, 500, 1000, 2000, 4000, 8000]
+    print(f"{'shape':<12} {'instrs':>8} {'sccp (s)':>10} {'us/instr':>9}")
+    # many tiny blocks, then everything in one block
+    for shape, make in (('if-chain', if_chain_source), ('straight', straight_line_source)):
+        for count in sizes:
+            size, elapsed = run(make(count))
+            print(f"{shape:<12} {size:>8} {elapsed:>10.4f} {elapsed / size * 1e6:>9.2f}")
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,84 @@
+import contextlib
+import os
+import pickle
+import sys
+import tempfile
+import time
+import serialize
+from bench.engine import build
+
+
+def best(fn, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def write_file(path, mode, writer):
+    with open(path, mode, buffering=serialize.CHUNK_SIZE) as f:
+        writer(f)
+
+
+def run(diamonds, directory):
+    cfg = build(diamonds)
+    instrs = cfg.instruction_count()
+    paths = {name: os.path.join(directory, name) for name in ('print', 'pickle', 'text', 'binary', 'binary.z')}
+
+    def printed(f):
+        with contextlib.redirect_stdout(f):
+            cfg.print()
+
+    writers = {
+        'print': ('w', printed),
+        'pickle': ('wb', lambda f: pickle.dump(cfg, f, pickle.HIGHEST_PROTOCOL)),
+        'text': ('w', lambda f: serialize.write_text(cfg, f)),
+        'binary': ('wb', lambda f: serialize.write_binary(cfg, f)),
+        'binary.z': ('wb', lambda f: serialize.write_binary(cfg, f, compress=True)),
+    }
+    readers = {
+        'pickle': lambda path: pickle.load(open(path, 'rb')),
+        'text': serialize.load,
+        'binary': serialize.load,
+        'binary.z': serialize.load,
+    }
+
+    rows = []
+    for name, (mode, writer) in writers.items():
+        path = paths[name]
+        try:
+            write_time = best(lambda: write_file(path, mode, writer))
+        except RecursionError:
+            rows.append((name, None, None, None))
+            continue
+        size = os.path.getsize(path)
+        read_time = best(lambda: readers[name](path)) if name in readers else None
+        if name in readers and name != 'pickle':
+            assert readers[name](path).format() == cfg.format(), f"{name} round trip differs"
+        rows.append((name, size, write_time, read_time))
+    return instrs, rows
+
+
+def main(argv):
+    sizes = [int(a) for a in argv[1:]] or [100, 1000, 4000]
+    # pickle recurses through the pred/succ links of long block chains and
+    # gives up (or overflows the C stack, with a much higher limit) on big CFGs
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+    with tempfile.TemporaryDirectory() as directory:
+        for diamonds in sizes:
+            instrs, rows = run(diamonds, directory)
+            print(f"=== {instrs} instructions ===")
+            print(f"{'format':<9} {'bytes':>10} {'write ms':>9} {'Minstr/s':>9} {'read ms':>9} {'Minstr/s':>9}")
+            for name, size, write_time, read_time in rows:
+                if size is None:
+                    print(f"{name:<9} {'RecursionError':>20}")
+                    continue
+                read = f"{read_time * 1e3:>9.2f} {instrs / read_time / 1e6:>9.2f}" if read_time else f"{'-':>9} {'-':>9}"
+                print(f"{name:<9} {size:>10} {write_time * 1e3:>9.2f} {instrs / write_time / 1e6:>9.2f} {read}")
+            print()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,55 @@
+import sys
+import time
+from parser import Parser
+from passes import PassManager
+from bench.workload import generate_source, loop_source
+
+
+def best(fn, repeat=3):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def build(source, passes):
+    cfg = Parser(source).parse()
+    pm = PassManager(cfg)
+    pm.build_ssa("pruned")
+    pm.run_pipeline(passes)
+    return cfg
+
+
+def run(source):
+    # the same pipeline with and without the cleanup; time includes SSA
+    rows = []
+    for passes in ("sccp,gvn,licm,dce", "sccp,simplifycfg,gvn,licm,dce,simplifycfg"):
+        elapsed, cfg = best(lambda: build(source, passes))
+        instrs = sum(len(block.instr) for block in cfg.blocks)
+        rows.append((passes, elapsed, len(cfg.blocks), instrs))
+    return rows
+
+
+WORKLOADS = {
+    'diamonds': lambda size: generate_source(diamonds=size),
+    'loops': lambda size: loop_source(depth=3, invariants=size // 10, body=size // 10),
+}
+
+
+def main(argv):
+    sizes = [int(a) for a in argv[1:]] or [100, 1000, 5000]
+    for shape, make in WORKLOADS.items():
+        for size in sizes:
+            rows = run(make(size))
+            print(f"=== {shape} {size} ===")
+            print(f"{'pipeline':<44} {'ms':>9} {'blocks':>7} {'instrs':>7}")
+            for passes, elapsed, blocks, instrs in rows:
+                print(f"{passes:<44} {elapsed * 1e3:>9.2f} {blocks:>7} {instrs:>7}")
+            print()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,59 @@
+import sys
+import time
+from ir import PhiNode
+from parser import Parser
+from passes import PassManager
+from bench.workload import generate_source, loop_source
+
+
+def best(fn, repeat=5):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def count_phis(cfg):
+    return sum(isinstance(instr, PhiNode) for block in cfg.blocks for instr in block.instr)
+
+
+def frontiers(source, mode):
+    cfg = Parser(source).parse()
+    PassManager(cfg).build_ssa(mode)
+    return cfg
+
+
+def run(source):
+    # parse alone, then each way of getting to SSA form (parse included)
+    rows = [('parse only',) + best(lambda: Parser(source).parse())]
+    for mode in ("minimal", "semi-pruned", "pruned"):
+        rows.append((f"frontiers/{mode}",) + best(lambda: frontiers(source, mode)))
+    rows.append(('direct',) + best(lambda: Parser(source, ssa=True).parse()))
+    return [(name, elapsed, count_phis(cfg)) for name, elapsed, cfg in rows]
+
+
+WORKLOADS = {
+    'diamonds': lambda size: generate_source(diamonds=size),
+    'loops': lambda size: loop_source(depth=3, invariants=size // 10, body=size // 10),
+}
+
+
+def main(argv):
+    sizes = [int(a) for a in argv[1:]] or [100, 1000, 5000]
+    for shape, make in WORKLOADS.items():
+        for size in sizes:
+            source = make(size)
+            rows = run(source)
+            print(f"=== {shape} {size}: {source.count(chr(10)) + 1} lines ===")
+            print(f"{'construction':<22} {'ms':>9} {'SSA ms':>9} {'phis':>7}")
+            parse = rows[0][1]
+            for name, elapsed, phis in rows:
+                print(f"{name:<22} {elapsed * 1e3:>9.2f} {(elapsed - parse) * 1e3:>9.2f} {phis:>7}")
+            print()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,71 @@
+import sys
+import time
+import numpy as np
+from parser import Parser
+from passes import PassManager
+from engine import compile_cfg, input_names
+from vector import BatchEvaluator
+from bench.engine import build
+
+
+# a division nested in a larger expression, behind a zero test: lanes
+# with b == 0 never evaluate it
+GUARDED_DIVISION = """
+if (b != 0) {
+    var y = (a / b) + 1;
+} else {
+    var y = 7;
+}
+return y;
+"""
+
+
+def check_guarded_division():
+    cfg = Parser(GUARDED_DIVISION).parse()
+    PassManager(cfg).build_ssa("pruned")
+    inputs = {'a': [1, 2, 3], 'b': [1, 0, 2]}
+    fn = compile_cfg(cfg)
+    scalar = [fn(*row) for row in zip(*(inputs[name] for name in fn.params))]
+    result = BatchEvaluator(cfg)(inputs)
+    assert scalar == result.tolist(), "vectorized result differs from the scalar engine"
+
+
+def throughput(fn, records):
+    start = time.perf_counter()
+    fn()
+    return records / (time.perf_counter() - start)
+
+
+def run(diamonds, size, scalar_limit=20000):
+    cfg = build(diamonds)
+    names = input_names(cfg)
+    rng = np.random.default_rng(size)
+    inputs = {name: rng.integers(-1000, 1000, size) for name in names}
+    evaluator = BatchEvaluator(cfg)
+    fn = compile_cfg(cfg)
+
+    vector_rate = throughput(lambda: evaluator(inputs, size), size)
+    result = evaluator(inputs, size)
+
+    # the scalar path is timed on a prefix; it is linear in the record count
+    count = min(size, scalar_limit)
+    columns = [inputs[name][:count].tolist() for name in fn.params]
+    rows = list(zip(*columns))
+    scalar = []
+    scalar_rate = throughput(lambda: scalar.extend(fn(*row) for row in rows), count)
+    assert scalar == result[:count].tolist(), "vectorized result differs from the scalar engine"
+    return cfg.instruction_count(), scalar_rate, vector_rate
+
+
+def main(argv):
+    diamonds = int(argv[1]) if len(argv) > 1 else 50
+    sizes = [int(a) for a in argv[2:]] or [1000, 10000, 100000, 1000000]
+    check_guarded_division()
+    print(f"{'records':>9} {'instrs':>7} {'scalar rec/s':>13} {'vector rec/s':>13} {'speedup':>8}")
+    for size in sizes:
+        instrs, scalar_rate, vector_rate = run(diamonds, size)
+        print(f"{size:>9} {instrs:>7} {scalar_rate:>13.0f} {vector_rate:>13.0f} {vector_rate / scalar_rate:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main(sys.argv)
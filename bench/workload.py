@@ -0,0 +1,176 @@
+import random
+from ir import Var, BinOp, IfStmt, GotoStmt, ReturnStmt, BasicBlock
+
+
+def diamond_chain(count):
+    blocks = [BasicBlock("bb0", [])]
+    current = blocks[0]
+    for _ in range(count):
+        then_block, else_block, merge_block = [BasicBlock(f"bb{len(blocks) + i}", []) for i in range(3)]
+        for arm in (then_block, else_block):
+            current.add_succ(arm)
+            arm.add_pred(current)
+            arm.add_succ(merge_block)
+            merge_block.add_pred(arm)
+        blocks.extend([then_block, else_block, merge_block])
+        current = merge_block
+    return blocks
+
+
+def random_graph(count, seed=0, max_succ=3):
+    rng = random.Random(seed)
+    blocks = [BasicBlock(f"bb{i}", []) for i in range(count)]
+    for i, block in enumerate(blocks):
+        if i + 1 < count:
+            block.add_succ(blocks[i + 1])
+            blocks[i + 1].add_pred(block)
+        for _ in range(rng.randint(0, max_succ - 1)):
+            target = blocks[rng.randrange(count)]
+            block.add_succ(target)
+            target.add_pred(block)
+    return blocks
+
+
+def if_chain_source(count, variables=4, seed=0):
+    rng = random.Random(seed)
+    names = [f"v{i}x" for i in range(variables)]
+    lines = [f"var {name} = {rng.randint(0, 9)};" for name in names]
+    for i in range(count):
+        target = rng.choice(names)
+        lhs, rhs = rng.choice(names), rng.choice(names)
+        lines.append(f"if ({lhs} > {i % 7}) {{")
+        lines.append(f"    var {target} = {lhs} + {rhs};")
+        lines.append("} else {")
+        lines.append(f"    var {target} = {rng.randint(0, 9)};")
+        lines.append("}")
+    lines.append(f"return {names[0]};")
+    return "\n".join(lines)
+
+
+def straight_line_source(count):
+    # one basic block of chained adds; every value is a constant
+    lines = ["var t0 = 1;"]
+    for i in range(1, count):
+        lines.append(f"var t{i} = t{i - 1} + {i % 7};")
+    lines.append(f"return t{count - 1};")
+    return "\n".join(lines)
+
+
+def generate_source(variables=8, diamonds=100, chain=4, redefinitions=4, inputs=2, seed=0):
+    # programs in the Parser language: straight-line redefinitions with
+    # expression chains of `chain` terms, separated by if/else diamonds;
+    # the first `inputs` variables start from undefined names so that
+    # sccp can't fold the whole program away
+    rng = random.Random(seed)
+    names = [f"v{i}x" for i in range(variables)]
+
+    def operand():
+        if rng.random() < 0.75:
+            return rng.choice(names)
+        return str(rng.randint(0, 99))
+
+    def expression(length):
+        parts = [operand()]
+        for _ in range(length - 1):
+            parts.append(rng.choice('+-'))
+            parts.append(operand())
+        return " ".join(parts)
+
+    def assignments(count, indent=""):
+        return [f"{indent}var {rng.choice(names)} = {expression(chain)};" for _ in range(count)]
+
+    lines = []
+    for i, name in enumerate(names):
+        lines.append(f"var {name} = {f'arg{i}' if i < inputs else rng.randint(0, 9)};")
+    for _ in range(diamonds):
+        lines.extend(assignments(redefinitions))
+        lines.append(f"if ({rng.choice(names)} < {operand()}) {{")
+        lines.extend(assignments(max(1, redefinitions // 2), "    "))
+        lines.append("} else {")
+        lines.extend(assignments(max(1, redefinitions // 2), "    "))
+        lines.append("}")
+    lines.append(f"return {names[0]};")
+    return "\n".join(lines)
+
+
+def loop_source(depth=2, invariants=4, body=4, variables=4, inputs=2, seed=0):
+    # `depth` nested while loops counting i0, i1, ... up to n. Each level
+    # computes `invariants` expressions from names that never change inside
+    # it, then `body` updates of accumulators a0x, a1x, ... that each read
+    # one of those expressions and the loop counter
+    rng = random.Random(seed)
+    names = [f"v{i}x" for i in range(variables)]
+    accumulators = [f"a{i}x" for i in range(variables)]
+    lines = [f"var {name} = {f'arg{i}' if i < inputs else rng.randint(1, 9)};" for i, name in enumerate(names)]
+    lines.extend(f"var {name} = 0;" for name in accumulators)
+    outside = list(names)
+    for level in range(depth):
+        indent = "    " * level
+        counter = f"i{level}"
+        lines.append(f"{indent}var {counter} = 0;")
+        lines.append(f"{indent}while ({counter} < n) {{")
+        for k in range(invariants):
+            lhs, rhs = rng.sample(outside, 2)
+            lines.append(f"{indent}    var k{level}x{k} = {lhs} * {rhs} + {rng.randint(1, 9)};")
+        hoistable = [f"k{level}x{k}" for k in range(invariants)]
+        outside = outside + hoistable
+        for j in range(body):
+            target = accumulators[j % variables]
+            source = accumulators[(j + 1) % variables]
+            lines.append(f"{indent}    var {target} = {source} + {hoistable[j % invariants]} + {counter};")
+    for level in reversed(range(depth)):
+        indent = "    " * level
+        lines.append(f"{indent}    var i{level} = i{level} + 1;")
+        lines.append(f"{indent}}}")
+    lines.append(f"return {accumulators[0]};")
+    return "\n".join(lines)
+
+
+def connect(src, dst):
+    src.add_succ(dst)
+    dst.add_pred(src)
+
+
+def loop_nest(depth):
+    # while-shaped loops nested `depth` deep: every header branches into
+    # the next level or out to the enclosing latch, every latch jumps back
+    entry = BasicBlock("bb0", [])
+    headers = [BasicBlock(f"bb{1 + i}", []) for i in range(depth)]
+    body = BasicBlock(f"bb{1 + depth}", [])
+    latches = [BasicBlock(f"bb{2 + depth + i}", []) for i in range(depth)]
+    exit_block = BasicBlock(f"bb{2 + 2 * depth}", [])
+
+    connect(entry, headers[0])
+    for i, header in enumerate(headers):
+        connect(header, headers[i + 1] if i + 1 < depth else body)
+        connect(header, latches[i - 1] if i > 0 else exit_block)
+    connect(body, latches[-1])
+    for i, latch in enumerate(latches):
+        connect(latch, headers[i])
+    return [entry] + headers + [body] + list(reversed(latches)) + [exit_block]
+
+
+def populate(blocks, variables=4, defs_per_block=2, inputs=2, seed=0):
+    # give a generated CFG shape instructions and terminators that agree
+    # with its succ lists, so every SSA stage can run on it
+    rng = random.Random(seed)
+    names = [f"v{i}x" for i in range(variables)]
+    blocks[0].instr.extend(Var(name, f"arg{i}" if i < inputs else i) for i, name in enumerate(names))
+    for block in blocks:
+        for _ in range(defs_per_block):
+            block.instr.append(Var(rng.choice(names), BinOp(rng.choice(names), rng.choice(names), '+')))
+        if not block.succ:
+            block.instr.append(ReturnStmt(names[0]))
+        elif len(block.succ) == 1:
+            block.instr.append(GotoStmt(block.succ[0].name))
+        else:
+            condition = BinOp(rng.choice(names), rng.choice(names), '<')
+            block.instr.append(IfStmt(condition, GotoStmt(block.succ[0].name), GotoStmt(block.succ[1].name)))
+    return blocks
+
+
+SHAPES = {
+    'diamonds': lambda size, seed: diamond_chain(size),
+    'loops': lambda size, seed: loop_nest(size),
+    'random': lambda size, seed: random_graph(size, seed, max_succ=2),
+}
@@ -0,0 +1,134 @@
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+import serialize
+
+
+TOOL_VERSION = "0.3"
+
+# each entry is the instruction count parsed from the source, then the
+# serialized CFG
+ENTRY_HEADER = struct.Struct('<I')
+
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024
+
+
+def cache_key(source, **options):
+    # marshal output is only stable within one Python minor version, so that
+    # is part of the key along with the tool and serialization versions
+    h = hashlib.sha256()
+    h.update(f"{TOOL_VERSION}\0{serialize.MAGIC.decode()}\0{sys.version_info[0]}.{sys.version_info[1]}\0".encode())
+    for name in sorted(options):
+        h.update(f"{name}={options[name]}\0".encode())
+    h.update(source.encode() if isinstance(source, str) else source)
+    return h.hexdigest()
+
+
+class CompilationCache:
+    # one file per entry under directory/<key[:2]>/<key>; entries are written
+    # to a temporary file and renamed into place, so concurrent builds never
+    # see a partial entry. Hits touch the mtime, and eviction removes the
+    # oldest entries first (LRU).
+    def __init__(self, directory, max_bytes=DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = None
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def load(self, key):
+        # (cfg, instructions parsed) or None
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            parsed, = ENTRY_HEADER.unpack_from(data)
+            cfg = serialize.loads(data[ENTRY_HEADER.size:])
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (ValueError, struct.error):
+            self.misses += 1
+            self.discard(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return cfg, parsed
+
+    def store(self, key, cfg, parsed=0):
+        data = ENTRY_HEADER.pack(parsed) + serialize.dumps(cfg)
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            self.discard(tmp)
+            raise
+        self.stores += 1
+
+        if self.size is None:
+            self.size = sum(size for _, size, _ in self.entries())
+        else:
+            self.size += len(data)
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def entries(self):
+        if not os.path.isdir(self.directory):
+            return
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.startswith('.tmp-'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def evict(self, target=None):
+        # shrink to 80% of the bound so a full cache doesn't rescan on every store
+        if target is None:
+            target = self.max_bytes * 0.8
+        entries = sorted(self.entries(), key=lambda e: e[2])
+        size = sum(size for _, size, _ in entries)
+        for path, entry_size, _ in entries:
+            if size <= target:
+                break
+            if self.discard(path):
+                self.evictions += 1
+                size -= entry_size
+        self.size = size
+
+    def discard(self, path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def clear(self):
+        self.evict(target=0)
+
+    def to_dict(self):
+        return {'hits': self.hits, 'misses': self.misses, 'stores': self.stores, 'evictions': self.evictions}
+
+    def format(self):
+        lookups = self.hits + self.misses
+        rate = 100.0 * self.hits / lookups if lookups else 0.0
+        return (f"cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate), "
+                f"{self.stores} stored, {self.evictions} evicted")
@@ -1,27 +1,260 @@
-from graphviz import Digraph
 from copy import deepcopy
-from ir import Var, BinOp, IfStmt, ReturnStmt, PhiNode, BasicBlock
+from ir import Var, BinOp, IfStmt, ReturnStmt, GotoStmt, PhiNode, BasicBlock, Value, ValueTable, defined_value
+from dominance import compute_idoms, DominatorSets, DomTree, natural_loops
+from dataflow import BitIndex, live_variables
+
+
+SSA_MODES = ("minimal", "semi-pruned", "pruned")
+SSA_CONSTRUCTIONS = ("frontiers", "direct")
+
+EXIT = BasicBlock("<exit>")
 
 
 class SSAManager:
-    def __init__(self, variables):
+    def __init__(self, variables, table):
+        self.table = table
         self.counters = {v: 0 for v in variables}
         self.stacks = {v: [] for v in variables}
+        self.undefined = {}
 
-    def new_name(self, var):
+    def new_name(self, var, defn=None):
         self.counters[var] += 1
-        name = f"{var}{self.counters[var]}"
-        self.stacks[var].append(name)
-        return name
+        value = self.table.new(var, self.counters[var], defn)
+        self.stacks[var].append(value)
+        return value
 
     def current_name(self, var):
-        return self.stacks[var][-1] if self.stacks[var] else f"{var}0"
+        stack = self.stacks[var]
+        if stack:
+            return stack[-1]
+        value = self.undefined.get(var)
+        if value is None:
+            value = self.undefined[var] = self.table.new(var, 0)
+        return value
 
     def pop_name(self, var):
         if self.stacks[var]:
             self.stacks[var].pop()
 
 
+class SSABuilder:
+    # Braun et al.: "Simple and Efficient Construction of Static Single
+    # Assignment Form". The parser hands over every instruction as it is
+    # emitted; reads look up the nearest definition through the predecessors,
+    # placing phis only in merge blocks that need them. Blocks whose
+    # predecessors are not all known yet (loop headers) get incomplete phis,
+    # filled in by seal(). Trivial phis are forwarded to their only operand
+    # and dropped. A value handed out can only be forwarded later if it came
+    # from inside an open loop, so only instructions emitted there are kept
+    # for finish() to rewrite.
+    def __init__(self, table):
+        self.table = table
+        self.current = {}
+        self.sealed = set()
+        self.incomplete = {}
+        self.phi_block = {}
+        self.phi_users = {}
+        self.forward = {}
+        self.counters = {}
+        self.undefined = {}
+        self.assigned = set()
+        self.open_loops = 0
+        self.pending = []
+        self.phis_removed = 0
+
+    def new_value(self, var, defn):
+        version = self.counters.get(var, 0) + 1
+        self.counters[var] = version
+        return self.table.new(var, version, defn)
+
+    def undefined_value(self, var):
+        value = self.undefined.get(var)
+        if value is None:
+            value = self.undefined[var] = self.table.new(var, 0)
+        return value
+
+    def find(self, value):
+        forward = self.forward
+        while isinstance(value, Value) and value in forward:
+            value = forward[value]
+        return value
+
+    def emit(self, block, instr):
+        def read(name):
+            if isinstance(name, str) and name != "undef":
+                return self.read(name, block)
+            return name
+
+        if isinstance(instr, ReturnStmt):
+            instr.retval = read(instr.base_name)
+        else:
+            instr.map_uses(read)
+        block.instr.append(instr)
+        if self.open_loops or self.undefined:
+            self.pending.append(instr)
+        if isinstance(instr, Var):
+            var = instr.name
+            self.assigned.add(var)
+            instr.name = self.new_value(var, instr)
+            self.current.setdefault(var, {})[block] = instr.name
+
+    def new_phi(self, var, block):
+        phi = PhiNode(var)
+        phi.name = self.new_value(var, phi)
+        index = 0
+        while index < len(block.instr) and isinstance(block.instr[index], PhiNode):
+            index += 1
+        block.instr.insert(index, phi)
+        self.phi_block[phi] = block
+        if self.open_loops or self.undefined:
+            self.pending.append(phi)
+        return phi
+
+    def add_operand(self, phi, value, pred):
+        phi.add_incoming(value, pred)
+        if isinstance(value, Value):
+            self.phi_users.setdefault(value, []).append(phi)
+
+    def read(self, var, block):
+        defs = self.current.get(var)
+        if defs is None:
+            # nothing has defined var yet and no back edge can bring a later
+            # definition here: it is an input
+            if not self.open_loops:
+                return var
+            defs = self.current[var] = {}
+
+        # straight-line predecessors first; most reads end there
+        path = []
+        sealed = self.sealed
+        while block not in defs and block in sealed and len(block.pred) == 1:
+            path.append(block)
+            block = block.pred[0]
+        if block in defs:
+            value = self.find(defs[block])
+        else:
+            value = self.lookup(var, block, defs)
+        for block in path:
+            defs[block] = value
+        return value
+
+    def lookup(self, var, block, defs):
+        # the recursive lookup of the paper, on an explicit stack so long
+        # chains of blocks don't exhaust the Python stack. A merge block's
+        # phi is only made once its operands turn out to differ, or when the
+        # walk comes back around to the block before they are known
+        results = []
+        visiting = {}
+        stack = [('read', block)]
+        while stack:
+            action, block = stack.pop()
+            if action == 'merge':
+                count = len(block.pred)
+                operands = results[len(results) - count:]
+                del results[len(results) - count:]
+                phi = visiting.pop(block)
+                if phi is None and all(value is operands[0] for value in operands):
+                    value = operands[0]
+                else:
+                    if phi is None:
+                        phi = self.new_phi(var, block)
+                    for value, pred in zip(operands, block.pred):
+                        self.add_operand(phi, value, pred)
+                    value = self.remove_trivial(phi)
+            elif action == 'copy':
+                value = results.pop()
+            elif block in defs:
+                results.append(self.find(defs[block]))
+                continue
+            elif block in visiting:
+                phi = visiting[block]
+                if phi is None:
+                    phi = visiting[block] = self.new_phi(var, block)
+                results.append(phi.name)
+                continue
+            elif block not in self.sealed:
+                phi = self.new_phi(var, block)
+                self.incomplete.setdefault(block, []).append(phi)
+                value = phi.name
+            elif len(block.pred) == 1:
+                stack.append(('copy', block))
+                stack.append(('read', block.pred[0]))
+                continue
+            elif not block.pred:
+                value = self.undefined_value(var)
+            else:
+                visiting[block] = None
+                stack.append(('merge', block))
+                stack.extend(('read', pred) for pred in reversed(block.pred))
+                continue
+            defs[block] = value
+            results.append(value)
+        return results[-1]
+
+    def seal(self, block):
+        self.sealed.add(block)
+        for phi in self.incomplete.pop(block, ()):
+            for pred in block.pred:
+                self.add_operand(phi, self.read(phi.var, pred), pred)
+            self.remove_trivial(phi)
+
+    def remove_trivial(self, phi):
+        # a phi whose operands are all one value (or itself) is that value;
+        # removing it can make the phis that read it trivial in turn
+        first = phi
+        worklist = [phi]
+        while worklist:
+            phi = worklist.pop()
+            block = self.phi_block.get(phi)
+            if block is None or block not in self.sealed or phi.name in self.forward:
+                continue
+            same = None
+            for value, _ in phi.incoming:
+                value = self.find(value)
+                if value is phi.name or value is same:
+                    continue
+                if same is not None:
+                    break
+                same = value
+            else:
+                if same is None:
+                    same = self.undefined_value(phi.var)
+                self.forward[phi.name] = same
+                phi.name.defn = None
+                block.instr.remove(phi)
+                del self.phi_block[phi]
+                self.phis_removed += 1
+                users = self.phi_users.pop(phi.name, [])
+                if isinstance(same, Value):
+                    self.phi_users.setdefault(same, []).extend(users)
+                worklist.extend(user for user in users if user is not phi)
+        return self.find(first.name)
+
+    def finish(self):
+        # undefined values of names nothing ever assigned are inputs
+        for var, value in self.undefined.items():
+            if var not in self.assigned:
+                self.forward[value] = var
+
+        def resolve(value):
+            return self.find(value) if isinstance(value, Value) else value
+
+        for instr in self.pending:
+            instr.map_uses(resolve)
+        self.pending = []
+
+        # drop the values of removed phis and renumber the rest densely
+        forward = self.forward
+        values = [v for v in self.table if v not in forward]
+        versions = {}
+        for i, value in enumerate(values):
+            value.id = i
+            if value.version:
+                value.version = versions[value.var] = versions.get(value.var, 0) + 1
+        self.table.values = values
+        return self.table
+
+
 class CFG:
     def __init__(self, blocks):
         self.blocks = blocks
@@ -31,7 +264,12 @@ class CFG:
         self.node_attr = {'shape': 'box', 'style': 'filled', 'fillcolor': 'lightgrey'}
         self.edge_attr = {}
 
-        self.dominators = {b: set(self.blocks) for b in self.blocks}
+        self.idoms = {}
+        self.rpo = []
+        self.domtree = None
+        self.domtree_version = -1
+        self.shape_version = 0
+        self.dominators = DominatorSets(self.idoms)
         self.frontiers = {b: set() for b in self.blocks}
         self.variables = set(
             var.name
@@ -40,42 +278,83 @@ class CFG:
             if isinstance(var, Var)
         )
 
-        self.ssa_values = set()
+        self.def_sites = {}
+        self.block_uses = {}
+        self.block_defs = {}
+        self.globals = set()
+        self.live_index = BitIndex()
+        self.live_in = {}
+        self.live_out = {}
+
+        self.ssa_values = ValueTable()
+        # set by out-of-ssa: the values are then plain variables, assigned
+        # more than once, and the CFG can't be optimized again
+        self.left_ssa = False
         self.ssa_users = {}
-
-    def compute_dominators(self):
-        self.dominators[self.start] = {self.start}
-        changed = True
-        while changed:
-            changed = False
-            for block in self.blocks:
-                if block == self.start:
-                    continue
-                if not block.pred:
-                    continue
-                new_dom = set(self.dominators[block.pred[0]])
-                for p in block.pred[1:]:
-                    new_dom &= self.dominators[p]
-                new_dom.add(block)
-                if new_dom != self.dominators[block]:
-                    self.dominators[block] = new_dom
-                    changed = True
+        self.instr_block = {}
+        self.ipdoms = {}
+        self.control_deps = {}
+        self.loops = {}
+
+    def compute_dominators(self, method="chk"):
+        idoms, rpo = compute_idoms(self.start, lambda b: b.succ, lambda b: b.pred, method)
+        self.idoms = {b: None for b in self.blocks}
+        self.idoms.update(idoms)
+        self.rpo = rpo
+        self.domtree = DomTree(self.idoms, rpo)
+        self.domtree_version = self.shape_version
+        self.dominators = DominatorSets(self.idoms)
+
+    def get_domtree(self):
+        if self.domtree is None or self.domtree_version != self.shape_version:
+            self.compute_dominators()
+        return self.domtree
 
     def get_idom(self):
-        idoms = {}
-        for block in self.blocks:
-            if block == self.start:
-                idoms[block] = None
-                continue
-            doms = self.dominators[block] - {block}
-            if not doms:
-                idoms[block] = None
-                continue
-            idoms[block] = min(doms, key=lambda x: len(self.dominators[x]))
-        return idoms
+        return self.get_domtree().idoms
+
+    def mark_shape_changed(self, keep_dominators=False):
+        # keep_dominators: the edit left dominance among the remaining blocks
+        # alone and the caller patched the cached tree (DomTree.remove)
+        current = self.domtree is not None and self.domtree_version == self.shape_version
+        self.shape_version += 1
+        if keep_dominators and current:
+            self.domtree_version = self.shape_version
+
+    def add_edge(self, src, dst):
+        src.add_succ(dst)
+        dst.add_pred(src)
+        self.mark_shape_changed()
+
+    def remove_edge(self, src, dst):
+        src.succ.remove(dst)
+        dst.pred.remove(src)
+        self.mark_shape_changed()
+
+    def split_edge(self, src, dst, name):
+        # new block on the edge src -> dst, placed just before dst; src's
+        # branch and dst's phis are retargeted to it
+        block = BasicBlock(name, [])
+        self.blocks.insert(self.blocks.index(dst), block)
+        self.insert_instr(block, 0, GotoStmt(dst.name))
+        src.succ[src.succ.index(dst)] = block
+        dst.pred[dst.pred.index(src)] = block
+        block.pred.append(src)
+        block.succ.append(dst)
+        branch = src.terminator()
+        if branch is not None:
+            for goto in (branch.thengoto, branch.elsegoto) if isinstance(branch, IfStmt) else (branch,):
+                if isinstance(goto, GotoStmt) and goto.goto == dst.name:
+                    goto.goto = name
+        for instr in dst.instr:
+            if isinstance(instr, PhiNode):
+                instr.incoming = [(v, block if p is src else p) for v, p in instr.incoming]
+        self.mark_shape_changed()
+        return block
 
     def compute_frontiers(self):
         idoms = self.get_idom()
+        self.frontiers = {b: set() for b in self.blocks}
         for block in self.blocks:
             if len(block.pred) > 1:
                 for pred in block.pred:
@@ -86,150 +365,370 @@ class CFG:
                             break
                         runner = idoms[runner]
 
-    def calculate_phi(self):
-        working_list = []
-        for var in self.variables:
-            for block in self.blocks:
-                if block.defined(var):
-                    working_list.append(block)
+    def compute_postdominators(self, method="chk"):
+        exits = [b for b in self.blocks if not b.succ]
+
+        def successors(node):
+            return exits if node is EXIT else node.pred
+
+        def predecessors(node):
+            if node is EXIT:
+                return []
+            return node.succ if node.succ else [EXIT]
+
+        self.ipdoms, _ = compute_idoms(EXIT, successors, predecessors, method)
+        return self.ipdoms
+
+    def compute_control_dependence(self):
+        ipdoms = self.compute_postdominators()
+        self.control_deps = {b: set() for b in self.blocks}
+        for block in self.blocks:
+            if block not in ipdoms or len(block.succ) < 2:
+                continue
+            for succ in block.succ:
+                runner = succ
+                while runner is not None and runner is not EXIT and runner is not ipdoms[block]:
+                    self.control_deps[runner].add(block)
+                    runner = ipdoms.get(runner)
+        return self.control_deps
+
+    def compute_loops(self):
+        # header -> set of blocks in its natural loop
+        domtree = self.get_domtree()
+        self.loops = natural_loops(domtree, lambda b: b.succ, lambda b: b.pred)
+        return self.loops
+
+    def compute_def_sites(self):
+        self.def_sites = {}
+        self.block_uses = {}
+        self.block_defs = {}
+        self.globals = set()
+        for block in self.blocks:
+            uses = set()
+            defs = set()
+            for instr in block.instr:
+                for name in instr.uses():
+                    if name not in defs:
+                        uses.add(name)
+                if isinstance(instr, Var):
+                    defs.add(instr.name)
+                    sites = self.def_sites.setdefault(instr.name, [])
+                    if not sites or sites[-1] is not block:
+                        sites.append(block)
+            self.block_uses[block] = uses
+            self.block_defs[block] = defs
+            self.globals |= uses
+        return self.def_sites
+
+    def compute_liveness(self):
+        # live variables before SSA, as bitsets over self.live_index; needs
+        # compute_def_sites
+        index = BitIndex(sorted(self.variables | self.globals))
+        uses = {b: index.bits(self.block_uses[b]) for b in self.blocks}
+        defs = {b: index.bits(self.block_defs[b]) for b in self.blocks}
+        self.live_index = index
+        self.live_in, self.live_out = live_variables(
+            self.start, self.blocks, lambda b: b.succ, lambda b: b.pred, uses, defs,
+            rpo=self.get_domtree().rpo)
+        return self.live_in
+
+    def compute_value_liveness(self, phis=None):
+        # (live_in, live_out) of SSA values, as sets: there are tens of
+        # thousands of values, each live over a few blocks, so bitsets would
+        # grow with the square of the program. A phi operand is live out of
+        # the predecessor it comes from, not into the phi's block; phi
+        # results are defined on entry to their block. If phis is given,
+        # only the operands of those phis count as uses
+        uses = {}
+        defs = {}
+        edge_uses = {}
+        for block in self.blocks:
+            used = set()
+            defined = set()
+            for instr in block.instr:
+                if isinstance(instr, PhiNode):
+                    if phis is None or instr in phis:
+                        for value, pred in instr.incoming:
+                            if isinstance(value, Value):
+                                edge_uses.setdefault((pred, block), set()).add(value)
+                else:
+                    for value in instr.uses():
+                        if isinstance(value, Value) and value not in defined:
+                            used.add(value)
+                value = defined_value(instr)
+                if value is not None:
+                    defined.add(value)
+            uses[block] = used
+            defs[block] = defined
+        return live_variables(self.start, self.blocks, lambda b: b.succ, lambda b: b.pred,
+                              uses, defs, edge_uses, empty=frozenset(), rpo=self.get_domtree().rpo)
+
+    def live_phis(self):
+        # phis some non-phi instruction reads, directly or through other
+        # phis; minimal SSA also places phis that only feed each other
+        live = set()
+        work = [value for block in self.blocks for instr in block.instr if not isinstance(instr, PhiNode)
+                for value in instr.uses() if isinstance(value, Value)]
+        while work:
+            phi = work.pop().defn
+            if isinstance(phi, PhiNode) and phi not in live:
+                live.add(phi)
+                work.extend(value for value in phi.uses() if isinstance(value, Value))
+        return live
+
+    def compute_live_intervals(self, live_out=None):
+        # live ranges of SSA values over a linear layout of the blocks in
+        # reverse postorder, as used by linear-scan allocation: instruction i
+        # of a block starting at s reads at s + 2i and writes at s + 2i + 1,
+        # so a value dying at an instruction doesn't overlap the one it
+        # defines; phis write at s. Returns value -> sorted, disjoint
+        # half-open (start, end) ranges
+        if live_out is None:
+            _, live_out = self.compute_value_liveness()
+        rpo = self.get_domtree().rpo
+        reachable = set(rpo)
+        layout = rpo + [b for b in self.blocks if b not in reachable]
+        ranges = {}
+        start = 0
+        for block in layout:
+            end = start + 2 * len(block.instr)
+            open_until = {v: end for v in live_out[block]}
+            for i in range(len(block.instr) - 1, -1, -1):
+                instr = block.instr[i]
+                if isinstance(instr, PhiNode):
+                    continue
+                value = defined_value(instr)
+                if value is not None:
+                    pos = start + 2 * i + 1
+                    ranges.setdefault(value, []).append((pos, open_until.pop(value, pos + 1)))
+                for value in instr.uses():
+                    if isinstance(value, Value) and value not in open_until:
+                        open_until[value] = start + 2 * i + 1
+            for instr in block.instr:
+                if isinstance(instr, PhiNode):
+                    ranges.setdefault(instr.name, []).append((start, open_until.pop(instr.name, start + 1)))
+            for value, until in open_until.items():
+                ranges.setdefault(value, []).append((start, until))
+            start = end
+
+        for value, parts in ranges.items():
+            parts.sort()
+            merged = [parts[0]]
+            for lo, hi in parts[1:]:
+                if lo <= merged[-1][1]:
+                    if hi > merged[-1][1]:
+                        merged[-1] = (merged[-1][0], hi)
+                else:
+                    merged.append((lo, hi))
+            ranges[value] = merged
+        return ranges
+
+    def place_phis(self, mode="minimal"):
+        if mode not in SSA_MODES:
+            raise ValueError(f"Unknown SSA mode: {mode}")
+        def_sites = self.compute_def_sites()
+        live_in = self.compute_liveness() if mode == "pruned" else None
+
+        placement = {}
+        for var, sites in def_sites.items():
+            if mode == "semi-pruned" and var not in self.globals:
+                continue
+            live_bit = self.live_index.bit(var)
+            has_phi = set()
+            seen = set(sites)
+            working_list = list(sites)
             while working_list:
                 defblock = working_list.pop()
                 for block in self.frontiers[defblock]:
-                    if block.inserted(var):
+                    if block in has_phi:
                         continue
-                    block.append_phi(var)
-                    working_list.append(block)
+                    if live_in is not None and not live_in[block] & live_bit:
+                        continue
+                    has_phi.add(block)
+                    placement.setdefault(block, []).append(var)
+                    if block not in seen:
+                        seen.add(block)
+                        working_list.append(block)
+        return placement
+
+    def count_phis(self, mode="minimal"):
+        return sum(len(names) for names in self.place_phis(mode).values())
+
+    def calculate_phi(self, mode="minimal"):
+        placement = self.place_phis(mode)
+        for block, names in placement.items():
+            block.insert_phis(names)
+        return sum(len(names) for names in placement.values())
 
     def rename(self):
-        ssa_mgr = SSAManager(self.variables)
-        idoms = self.get_idom()
-
-        domtree = {b: [] for b in self.blocks}
-        for b, idom in idoms.items():
-            if idom is not None:
-                domtree[idom].append(b)
+        ssa_mgr = SSAManager(self.variables, self.ssa_values)
+        stacks = ssa_mgr.stacks
+        domtree = self.get_domtree().children
+
+        def current(name):
+            if isinstance(name, str) and name in stacks:
+                return ssa_mgr.current_name(name)
+            return name
+
+        stack = [(self.start, None)]
+        while stack:
+            block, pushed = stack.pop()
+            if pushed is not None:
+                for var in pushed:
+                    ssa_mgr.pop_name(var)
+                continue
 
-        def rename_block(block):
+            pushed = []
             for instr in block.instr:
                 if isinstance(instr, PhiNode):
-                    newn = ssa_mgr.new_name(instr.name)
-                    self.ssa_values.add(newn)
-                    instr.name = newn
+                    instr.name = ssa_mgr.new_name(instr.var, instr)
+                    pushed.append(instr.var)
 
             for instr in block.instr:
+                if isinstance(instr, PhiNode):
+                    continue
+                if isinstance(instr, ReturnStmt):
+                    instr.retval = current(instr.base_name)
+                    continue
+                instr.map_uses(current)
                 if isinstance(instr, Var):
-                    if isinstance(instr.val, str) and instr.val in ssa_mgr.stacks:
-                        instr.val = ssa_mgr.current_name(instr.val)
-                    elif isinstance(instr.val, BinOp):
-                        if isinstance(instr.val.lhs, str) and instr.val.lhs in ssa_mgr.stacks:
-                            instr.val.lhs = ssa_mgr.current_name(instr.val.lhs)
-                        if isinstance(instr.val.rhs, str) and instr.val.rhs in ssa_mgr.stacks:
-                            instr.val.rhs = ssa_mgr.current_name(instr.val.rhs)
-                    instr.name = ssa_mgr.new_name(instr.name)
-                    self.ssa_values.add(instr.name)
-
-                elif isinstance(instr, BinOp):
-                    if isinstance(instr.lhs, str) and instr.lhs in ssa_mgr.stacks:
-                        instr.lhs = ssa_mgr.current_name(instr.lhs)
-                    if isinstance(instr.rhs, str) and instr.rhs in ssa_mgr.stacks:
-                        instr.rhs = ssa_mgr.current_name(instr.rhs)
-
-                elif isinstance(instr, IfStmt):
-                    cond = instr.condition
-                    if isinstance(cond, str) and cond in ssa_mgr.stacks:
-                        instr.condition = ssa_mgr.current_name(cond)
-                    elif isinstance(cond, BinOp):
-                        if isinstance(cond.lhs, str) and cond.lhs in ssa_mgr.stacks:
-                            cond.lhs = ssa_mgr.current_name(cond.lhs)
-                        if isinstance(cond.rhs, str) and cond.rhs in ssa_mgr.stacks:
-                            cond.rhs = ssa_mgr.current_name(cond.rhs)
-
-                elif isinstance(instr, ReturnStmt):
-                    if instr.base_name in ssa_mgr.stacks:
-                        instr.retval = ssa_mgr.current_name(instr.base_name)
+                    var = instr.name
+                    instr.name = ssa_mgr.new_name(var, instr)
+                    pushed.append(var)
 
             for succ in block.succ:
                 for instr in succ.instr:
                     if isinstance(instr, PhiNode):
-                        instr.update_incoming(block, ssa_mgr.current_name(instr.name.rstrip("0123456789")))
-
-            for child in domtree[block]:
-                rename_block(child)
+                        instr.update_incoming(block, ssa_mgr.current_name(instr.var))
 
-            for instr in block.instr:
-                if isinstance(instr, (Var, PhiNode)):
-                    ssa_mgr.pop_name(instr.name.rstrip("0123456789"))
-
-        rename_block(self.start)
+            stack.append((block, pushed))
+            for child in reversed(domtree[block]):
+                stack.append((child, None))
 
     def remove_def(self, value):
-        for block in self.blocks:
-            for instr in block.instr[:]:
-                if isinstance(instr, (Var, BinOp, PhiNode, IfStmt)):
-                    if getattr(instr, "name", None) == value:
-                        block.instr.remove(instr)
-                        print(f"{block.name} removed {len(block.instr)}")
-                        return
+        instr = self.def_of(value)
+        if instr is None or instr not in self.instr_block:
+            return False
+        self.remove_instr(instr)
+        return True
 
     def compute_ssa_uses(self):
-        self.ssa_users = {v: [] for v in self.ssa_values}
-
-        def visit(val, block, context, instr_ref):
-            if isinstance(val, str) and val in self.ssa_values:
-                self.ssa_users[val].append(instr_ref)
-            elif isinstance(val, BinOp):
-                visit(val.lhs, block, f"{context} (lhs)", instr_ref)
-                visit(val.rhs, block, f"{context} (rhs)", instr_ref)
+        self.ssa_users = {v: set() for v in self.ssa_values}
+        self.instr_block = {}
 
         for block in self.blocks:
             for instr in block.instr:
-                if isinstance(instr, Var):
-                    visit(instr.val, block, f"{instr.name} = ...", instr)
-                elif isinstance(instr, BinOp):
-                    visit(instr, block, f"{instr.lhs} {instr.op} {instr.rhs}", instr)
-                elif isinstance(instr, IfStmt):
-                    visit(instr.condition, block, "if ...", instr)
-                elif isinstance(instr, ReturnStmt):
-                    visit(instr.retval, block, "return ...", instr)
-                elif isinstance(instr, PhiNode):
-                    for val, pred in instr.incoming:
-                        visit(val, block, f"phi({instr.name}) from {pred.name}", instr)
+                self.instr_block[instr] = block
+                self.add_uses(instr)
+                value = defined_value(instr)
+                if value is not None:
+                    value.defn = instr
+
+    def add_uses(self, instr):
+        for val in instr.uses():
+            if isinstance(val, Value):
+                self.ssa_users.setdefault(val, set()).add(instr)
+
+    def drop_uses(self, instr):
+        for val in instr.uses():
+            if isinstance(val, Value):
+                self.ssa_users[val].discard(instr)
+
+    def def_of(self, value):
+        return value.defn if isinstance(value, Value) else None
+
+    def block_of(self, instr):
+        return self.instr_block.get(instr)
+
+    def users_of(self, value):
+        return self.ssa_users.get(value, ())
+
+    def insert_instr(self, block, index, instr):
+        block.instr.insert(index, instr)
+        self.instr_block[instr] = block
+        self.add_uses(instr)
+        value = defined_value(instr)
+        if value is not None:
+            value.defn = instr
+
+    def remove_instr(self, instr):
+        block = self.instr_block[instr]
+        block.instr.remove(instr)
+        self.forget_instr(instr)
+
+    def forget_instr(self, instr):
+        self.instr_block.pop(instr, None)
+        self.drop_uses(instr)
+        value = defined_value(instr)
+        if value is not None and value.defn is instr:
+            value.defn = None
+
+    def replace_instr(self, old, new):
+        block = self.instr_block.pop(old)
+        index = block.instr.index(old)
+        self.drop_uses(old)
+        block.instr[index] = new
+        self.instr_block[new] = block
+        self.add_uses(new)
+        value = defined_value(new)
+        if value is not None:
+            value.defn = new
+
+    def replace_instrs(self, replacements):
+        # replace_instr for many instructions at once, rewriting each block's
+        # list a single time rather than searching it once per instruction
+        blocks = set()
+        for old, new in replacements.items():
+            block = self.instr_block.pop(old)
+            blocks.add(block)
+            self.drop_uses(old)
+            self.instr_block[new] = block
+            self.add_uses(new)
+            value = defined_value(new)
+            if value is not None:
+                value.defn = new
+        for block in blocks:
+            block.instr = [replacements.get(instr, instr) for instr in block.instr]
+
+    def replace_all_uses(self, name, value, executable_blocks=None):
+        users = self.ssa_users.get(name)
+        if not users:
+            return 0
+        replaced = 0
+        for instr in list(users):
+            if executable_blocks is not None and self.instr_block[instr] not in executable_blocks:
+                continue
+            if instr.replace_uses(name, value):
+                users.discard(instr)
+                if isinstance(value, Value):
+                    self.ssa_users.setdefault(value, set()).add(instr)
+                replaced += 1
+        return replaced
 
     def is_leaf(self, ssa_name):
-        for block in self.blocks:
-            for instr in block.instr:
-                if getattr(instr, "name", None) == ssa_name:
-                    if not isinstance(instr, Var):
-                        return False
-                    val = instr.val
-                    return isinstance(val, (int, float, type(None)))
-        return False
+        instr = self.def_of(ssa_name)
+        if instr is None:
+            return False
+        if not isinstance(instr, Var):
+            return False
+        return isinstance(instr.val, (int, float, type(None)))
 
     def is_const(self, ssa_name):
-        for block in self.blocks:
-            for instr in block.instr:
-                if getattr(instr, "name", None) == ssa_name:
-                    return isinstance(instr, Var) and isinstance(instr.val, (int, float))
-        return False
+        instr = self.def_of(ssa_name)
+        return isinstance(instr, Var) and isinstance(instr.val, (int, float))
 
     def get_const(self, ssa_name):
-        for block in self.blocks:
-            for instr in block.instr:
-                if isinstance(instr, Var) and instr.name == ssa_name and isinstance(instr.val, (int, float)):
-                    return instr.val
+        instr = self.def_of(ssa_name)
+        if isinstance(instr, Var) and isinstance(instr.val, (int, float)):
+            return instr.val
         return None
 
     def propogate(self, name, value, executable_blocks=None):
-        for block in self.blocks:
-            if executable_blocks is not None and block not in executable_blocks:
-                continue
-            for instr in block.instr:
-                if instr.replace_uses(name, value):
-                    print("test")
-                    self.ssa_users[name].remove(instr)
-
+        return self.replace_all_uses(name, value, executable_blocks)
 
     def render(self, filename="cfg", view=False):
+        # graphviz is optional and slow to import; dot.write_dot needs neither
+        from graphviz import Digraph
         g = Digraph('CFG', node_attr=self.node_attr, edge_attr=self.edge_attr, graph_attr=self.graph_attr)
         for block in self.blocks:
             g.node(block.name, label=block.get_label())
@@ -239,19 +738,25 @@ class CFG:
             g.view(filename)
         return g
 
-    def print(self):
-        print("=== Control Flow Graph ===")
+    def format(self):
+        lines = ["=== Control Flow Graph ==="]
         for block in self.blocks:
-            print(f"\nBlock {block.name}:")
+            lines.append(f"\nBlock {block.name}:")
             pred_names = [p.name for p in block.pred]
             succ_names = [s.name for s in block.succ]
-            print(f"  Predecessors: {pred_names}")
-            print(f"  Successors  : {succ_names}")
+            lines.append(f"  Predecessors: {pred_names}")
+            lines.append(f"  Successors  : {succ_names}")
             if block.instr:
-                print("  Instructions:")
+                lines.append("  Instructions:")
                 for instr in block.instr:
-                    instr_lines = str(instr).split("\n")
-                    for line in instr_lines:
-                        print(f"    {line}")
+                    for line in str(instr).split("\n"):
+                        lines.append(f"    {line}")
             else:
-                print("  (No instructions)")
\ No newline at end of file
+                lines.append("  (No instructions)")
+        return "\n".join(lines)
+
+    def print(self):
+        print(self.format())
+
+    def instruction_count(self):
+        return sum(len(block.instr) for block in self.blocks)
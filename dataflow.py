@@ -0,0 +1,135 @@
+from dominance import reverse_postorder
+
+
+FORWARD, BACKWARD = "forward", "backward"
+UNION, INTERSECTION = "union", "intersection"
+
+
+class BitIndex:
+    # dense ids for the members of a universe; bit i of a bitset (a Python
+    # int) stands for items[i]
+    def __init__(self, items=()):
+        self.ids = {}
+        self.items = []
+        for item in items:
+            self.add(item)
+
+    def add(self, item):
+        id = self.ids.get(item)
+        if id is None:
+            id = self.ids[item] = len(self.items)
+            self.items.append(item)
+        return id
+
+    def bit(self, item):
+        id = self.ids.get(item)
+        return 0 if id is None else 1 << id
+
+    def bits(self, items):
+        ids = self.ids
+        bits = 0
+        for item in items:
+            id = ids.get(item)
+            if id is not None:
+                bits |= 1 << id
+        return bits
+
+    def members(self, bits):
+        items = self.items
+        out = []
+        while bits:
+            low = bits & -bits
+            out.append(items[low.bit_length() - 1])
+            bits ^= low
+        return out
+
+    def all(self):
+        return (1 << len(self.items)) - 1
+
+    def __contains__(self, item):
+        return item in self.ids
+
+    def __len__(self):
+        return len(self.items)
+
+
+def solve(entry, nodes, successors, predecessors, gen, kill, direction=FORWARD, meet=UNION,
+          boundary=0, top=0, edge_gen=None, rpo=None):
+    # Iterative gen/kill dataflow. Returns (ins, outs): the facts at the entry
+    # and at the exit of every node, whatever the direction. A node's output
+    # (exit going forward, entry going backward) is gen | (input - kill), its
+    # input the meet over the neighbours it flows from, plus
+    # edge_gen[(a, b)] for facts that only hold along the CFG edge a -> b.
+    # Nodes the flow has no neighbours to take from start at boundary,
+    # everything else at top (the empty set for union problems, the full
+    # universe for intersection).
+    #
+    # Facts are Python int bitsets, or sets when the universe is large and
+    # each fact small; only |, &, ^ and == are used. Nodes are visited in
+    # reverse postorder (postorder going backward), sweeping repeatedly over
+    # the ones whose input changed, so acyclic regions settle in one sweep.
+    # rpo, if given, is the reverse postorder of the nodes reachable from
+    # entry (a cached DomTree has it).
+    forward = direction == FORWARD
+    if not forward and direction != BACKWARD:
+        raise ValueError(f"Unknown direction: {direction}")
+    if meet not in (UNION, INTERSECTION):
+        raise ValueError(f"Unknown meet: {meet}")
+    union = meet == UNION
+    edge_gen = edge_gen or {}
+
+    order = list(rpo) if rpo is not None else reverse_postorder(entry, successors)
+    reachable = set(order)
+    if not forward:
+        order.reverse()
+    order.extend(node for node in nodes if node not in reachable)
+    sources = predecessors if forward else successors
+    targets = successors if forward else predecessors
+
+    ins = {}
+    outs = {}
+    before, after = (ins, outs) if forward else (outs, ins)
+    for node in order:
+        after[node] = top
+    index = {node: i for i, node in enumerate(order)}
+    pending = [True] * len(order)
+    remaining = len(order)
+    while remaining:
+        for i, node in enumerate(order):
+            if not pending[i]:
+                continue
+            pending[i] = False
+            remaining -= 1
+            value = None
+            for source in sources(node):
+                fact = after[source]
+                extra = edge_gen.get((source, node) if forward else (node, source))
+                if extra:
+                    fact = fact | extra
+                if value is None:
+                    value = fact
+                elif union:
+                    value = value | fact
+                else:
+                    value = value & fact
+            if value is None:
+                value = boundary
+            before[node] = value
+            killed = kill[node]
+            new = gen[node] | (value ^ (value & killed)) if killed else gen[node] | value
+            if new != after[node]:
+                after[node] = new
+                for target in targets(node):
+                    j = index[target]
+                    if not pending[j]:
+                        pending[j] = True
+                        remaining += 1
+    return ins, outs
+
+
+def live_variables(entry, nodes, successors, predecessors, uses, defs, edge_uses=None, empty=0, rpo=None):
+    # (live_in, live_out): uses are read before any def in the node,
+    # edge_uses[(a, b)] are live out of a only towards b (phi operands).
+    # empty is the empty fact: 0 for bitsets, frozenset() for sets
+    return solve(entry, nodes, successors, predecessors, uses, defs,
+                 direction=BACKWARD, boundary=empty, top=empty, edge_gen=edge_uses, rpo=rpo)
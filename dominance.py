@@ -0,0 +1,271 @@
+from collections.abc import Mapping
+
+
+def reverse_postorder(entry, successors):
+    order = []
+    visited = {entry}
+    stack = [(entry, iter(successors(entry)))]
+    while stack:
+        node, children = stack[-1]
+        for child in children:
+            if child not in visited:
+                visited.add(child)
+                stack.append((child, iter(successors(child))))
+                break
+        else:
+            stack.pop()
+            order.append(node)
+    order.reverse()
+    return order
+
+
+def idoms_chk(entry, successors, predecessors):
+    # Cooper, Harvey, Kennedy: "A Simple, Fast Dominance Algorithm"
+    rpo = reverse_postorder(entry, successors)
+    index = {node: i for i, node in enumerate(rpo)}
+    preds = [[index[p] for p in predecessors(node) if p in index] for node in rpo]
+    idom = [-1] * len(rpo)
+    idom[0] = 0
+
+    changed = True
+    while changed:
+        changed = False
+        for i in range(1, len(rpo)):
+            new_idom = -1
+            for p in preds[i]:
+                if idom[p] == -1:
+                    continue
+                if new_idom == -1:
+                    new_idom = p
+                    continue
+                a, b = p, new_idom
+                while a != b:
+                    while a > b:
+                        a = idom[a]
+                    while b > a:
+                        b = idom[b]
+                new_idom = a
+            if idom[i] != new_idom:
+                idom[i] = new_idom
+                changed = True
+
+    idoms = {rpo[i]: rpo[idom[i]] for i in range(1, len(rpo))}
+    idoms[entry] = None
+    return idoms, rpo
+
+
+def idoms_lt(entry, successors, predecessors):
+    # Lengauer, Tarjan: "A Fast Algorithm for Finding Dominators in a Flowgraph"
+    # (simple version with path compression)
+    order = []
+    parent = []
+    number = {}
+    stack = [(entry, -1)]
+    while stack:
+        node, par = stack.pop()
+        if node in number:
+            continue
+        number[node] = len(order)
+        order.append(node)
+        parent.append(par)
+        for succ in reversed(list(successors(node))):
+            if succ not in number:
+                stack.append((succ, number[node]))
+
+    n = len(order)
+    preds = [[number[p] for p in predecessors(node) if p in number] for node in order]
+    semi = list(range(n))
+    label = list(range(n))
+    ancestor = [-1] * n
+    idom = [0] * n
+    bucket = [[] for _ in range(n)]
+
+    def evaluate(v):
+        if ancestor[v] == -1:
+            return v
+        path = []
+        u = v
+        while ancestor[ancestor[u]] != -1:
+            path.append(u)
+            u = ancestor[u]
+        for u in reversed(path):
+            a = ancestor[u]
+            if semi[label[a]] < semi[label[u]]:
+                label[u] = label[a]
+            ancestor[u] = ancestor[a]
+        return label[v]
+
+    for w in range(n - 1, 0, -1):
+        for v in preds[w]:
+            u = evaluate(v)
+            if semi[u] < semi[w]:
+                semi[w] = semi[u]
+        bucket[semi[w]].append(w)
+        p = parent[w]
+        ancestor[w] = p
+        for v in bucket[p]:
+            u = evaluate(v)
+            idom[v] = u if semi[u] < semi[v] else p
+        bucket[p] = []
+
+    for w in range(1, n):
+        if idom[w] != semi[w]:
+            idom[w] = idom[idom[w]]
+
+    idoms = {order[i]: order[idom[i]] for i in range(1, n)}
+    idoms[entry] = None
+    rpo = reverse_postorder(entry, successors)
+    return idoms, rpo
+
+
+METHODS = {
+    'chk': idoms_chk,
+    'lt': idoms_lt,
+}
+
+
+def compute_idoms(entry, successors, predecessors, method='chk'):
+    try:
+        engine = METHODS[method]
+    except KeyError:
+        raise ValueError(f"Unknown dominator method: {method}")
+    return engine(entry, successors, predecessors)
+
+
+class DominatorSets(Mapping):
+    def __init__(self, idoms):
+        self.idoms = idoms
+
+    def __getitem__(self, node):
+        idoms = self.idoms
+        if node not in idoms:
+            raise KeyError(node)
+        doms = set()
+        while node is not None:
+            doms.add(node)
+            node = idoms[node]
+        return doms
+
+    def __iter__(self):
+        return iter(self.idoms)
+
+    def __len__(self):
+        return len(self.idoms)
+
+
+class DomTree:
+    def __init__(self, idoms, rpo):
+        self.idoms = idoms
+        self.rpo = rpo
+        self.root = rpo[0] if rpo else None
+        self.children = {b: [] for b in idoms}
+        for block, idom in idoms.items():
+            if idom is not None:
+                self.children[idom].append(block)
+
+        self.pre = {}
+        self.post = {}
+        self._depth = {}
+        if self.root is None:
+            return
+        clock = 0
+        self._depth[self.root] = 0
+        stack = [(self.root, iter(self.children[self.root]))]
+        self.pre[self.root] = clock
+        while stack:
+            node, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                clock += 1
+                self.post[node] = clock
+                continue
+            clock += 1
+            self.pre[child] = clock
+            self._depth[child] = self._depth[node] + 1
+            stack.append((child, iter(self.children[child])))
+
+    @property
+    def depth(self):
+        # renumbered on first use after remove(), which would otherwise
+        # have to walk the whole subtree it lifts
+        if self._depth is None:
+            depth = self._depth = {}
+            if self.root is not None:
+                depth[self.root] = 0
+                stack = [self.root]
+                while stack:
+                    node = stack.pop()
+                    for child in self.children[node]:
+                        depth[child] = depth[node] + 1
+                        stack.append(child)
+        return self._depth
+
+    def idom(self, node):
+        return self.idoms.get(node)
+
+    def remove(self, node):
+        # drop a node deleted from the graph without changing dominance among
+        # the others (unreachable, or merged into its idom): its children go
+        # to its idom and the pre/post numbers of the rest stay valid. The
+        # caller removes it from rpo
+        parent = self.idoms.pop(node, None)
+        children = self.children.pop(node, [])
+        if parent is not None:
+            siblings = self.children[parent]
+            siblings.remove(node)
+            siblings.extend(children)
+        for child in children:
+            self.idoms[child] = parent
+        self.pre.pop(node, None)
+        self.post.pop(node, None)
+        self._depth = None
+
+    def reachable(self, node):
+        return node in self.pre
+
+    def dominates(self, a, b):
+        if a is b:
+            return True
+        pre = self.pre
+        if a not in pre or b not in pre:
+            return False
+        return pre[a] <= pre[b] and self.post[b] <= self.post[a]
+
+    def strictly_dominates(self, a, b):
+        return a is not b and self.dominates(a, b)
+
+    def dominators(self, node):
+        doms = []
+        while node is not None:
+            doms.append(node)
+            node = self.idoms.get(node)
+        return doms
+
+    def preorder(self):
+        if self.root is None:
+            return
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(self.children[node]))
+
+
+def natural_loops(domtree, successors, predecessors):
+    # header -> body for every back edge (an edge into a dominator); loops
+    # sharing a header are merged
+    loops = {}
+    for node in domtree.rpo:
+        for succ in successors(node):
+            if not domtree.dominates(succ, node):
+                continue
+            body = loops.setdefault(succ, {succ})
+            stack = [node]
+            while stack:
+                member = stack.pop()
+                if member in body:
+                    continue
+                body.add(member)
+                stack.extend(p for p in predecessors(member) if domtree.reachable(p))
+    return loops
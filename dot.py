@@ -0,0 +1,160 @@
+from itertools import islice
+from serialize import ChunkedWriter, Buffer, CHUNK_SIZE
+
+
+CLUSTER_MODES = ("domtree", "loop")
+
+# clusters nest as deep as the dominator tree; past this depth the
+# indentation alone would dominate the file size
+MAX_INDENT = 16
+
+
+def quote(text):
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def format_attrs(attrs):
+    return ", ".join(f"{key}={quote(str(value))}" for key, value in attrs.items())
+
+
+def clip(line, width):
+    if width is not None and len(line) > width:
+        return line[:max(width - 3, 0)] + "..."
+    return line
+
+
+def find_chains(cfg, owner):
+    # maximal straight-line runs a -> b where a has one successor and b one
+    # predecessor, kept inside a single cluster; returns head -> members
+    chains = {}
+    for block in cfg.blocks:
+        pred = block.pred[0] if len(block.pred) == 1 else None
+        if pred is not None and len(pred.succ) == 1 and pred is not block and owner.get(pred) == owner.get(block):
+            continue
+        chain = [block]
+        current = block
+        while len(current.succ) == 1:
+            succ = current.succ[0]
+            if len(succ.pred) != 1 or succ is block or owner.get(succ) != owner.get(current):
+                break
+            chain.append(succ)
+            current = succ
+        chains[block] = chain
+    # a cycle made only of single-edge blocks has no head; give each block its own node
+    covered = {b for chain in chains.values() for b in chain}
+    for block in cfg.blocks:
+        if block not in covered:
+            chains[block] = [block]
+    return chains
+
+
+def domtree_clusters(cfg):
+    # one cluster per dominator-tree branch point, holding its whole subtree
+    domtree = cfg.get_domtree()
+    parents = {}
+    owner = {}
+    for block in domtree.preorder():
+        idom = domtree.idom(block)
+        enclosing = owner.get(idom) if idom is not None else None
+        if len(domtree.children[block]) > 1:
+            parents[block] = enclosing
+            owner[block] = block
+        else:
+            owner[block] = enclosing
+    return parents, owner
+
+
+def loop_clusters(cfg):
+    # one cluster per natural loop, nested by containment
+    loops = cfg.compute_loops()
+    by_size = sorted(loops, key=lambda h: len(loops[h]))
+    owner = {}
+    for header in by_size:
+        for block in loops[header]:
+            owner.setdefault(block, header)
+    parents = {}
+    for header in by_size:
+        parents[header] = next((h for h in by_size
+                                if header in loops[h] and len(loops[h]) > len(loops[header])), None)
+    return parents, owner
+
+
+def node_label(chain, max_lines, max_width):
+    names = chain[0].name if len(chain) == 1 else f"{chain[0].name} .. {chain[-1].name} ({len(chain)} blocks)"
+    instrs = (instr for block in chain for instr in block.instr)
+    total = sum(len(block.instr) for block in chain)
+    shown = islice(instrs, max_lines) if max_lines is not None else instrs
+    lines = [clip(names + ":", max_width)]
+    for instr in shown:
+        lines.extend(clip(line, max_width) for line in str(instr).split("\n"))
+    if max_lines is not None and total > max_lines:
+        lines.append(f"... {total - max_lines} more")
+    return "".join(quote(line)[1:-1] + "\\l" for line in lines)
+
+
+def write_dot(cfg, fh, max_lines=None, max_width=None, collapse=False, cluster=None):
+    if cluster is not None and cluster not in CLUSTER_MODES:
+        raise ValueError(f"Unknown cluster mode: {cluster}")
+    if cluster == "domtree":
+        parents, owner = domtree_clusters(cfg)
+    elif cluster == "loop":
+        parents, owner = loop_clusters(cfg)
+    else:
+        parents, owner = {}, {}
+
+    if collapse:
+        chains = find_chains(cfg, owner)
+    else:
+        chains = {block: [block] for block in cfg.blocks}
+    node_of = {member: head for head, chain in chains.items() for member in chain}
+
+    out = ChunkedWriter(fh)
+    out.write("digraph CFG {\n")
+    out.write(f"  graph [{format_attrs(cfg.graph_attr)}];\n")
+    out.write(f"  node [{format_attrs(cfg.node_attr)}];\n")
+    if cfg.edge_attr:
+        out.write(f"  edge [{format_attrs(cfg.edge_attr)}];\n")
+
+    members = {}
+    for head in chains:
+        members.setdefault(owner.get(head), []).append(head)
+    children = {}
+    for key, parent in parents.items():
+        children.setdefault(parent, []).append(key)
+
+    # walked with an explicit stack; cluster nesting is unbounded
+    stack = [(None, 0, False)]
+    while stack:
+        key, depth, closing = stack.pop()
+        indent = "  " * (min(depth, MAX_INDENT) + 1)
+        if closing:
+            out.write(f"{indent}}}\n")
+            continue
+        if key is not None:
+            out.write(f"{indent}subgraph {quote('cluster_' + key.name)} {{\n")
+            out.write(f"{indent}  label={quote(key.name)};\n")
+            stack.append((key, depth, True))
+            depth += 1
+            indent = "  " * (min(depth, MAX_INDENT) + 1)
+        for head in members.get(key, ()):
+            label = node_label(chains[head], max_lines, max_width)
+            out.write(f"{indent}{quote(head.name)} [label=\"{label}\"];\n")
+        for child in reversed(children.get(key, ())):
+            stack.append((child, depth, False))
+
+    for head, chain in chains.items():
+        for succ in chain[-1].succ:
+            out.write(f"  {quote(head.name)} -> {quote(node_of[succ].name)};\n")
+    out.write("}\n")
+    out.close()
+
+
+def save_dot(cfg, path, **options):
+    with open(path, 'w', buffering=CHUNK_SIZE) as f:
+        write_dot(cfg, f, **options)
+
+
+def dumps_dot(cfg, **options):
+    out = Buffer()
+    write_dot(cfg, out, **options)
+    return out.getvalue()
@@ -0,0 +1,290 @@
+import math
+from collections import OrderedDict
+from ir import Var, BinOp, IfStmt, ReturnStmt, GotoStmt, PhiNode, Value
+from dominance import reverse_postorder
+from passes import BINOPS
+from serialize import encode_cfg
+
+
+COMPARISONS = frozenset(('<', '>', '<=', '>=', '==', '!='))
+
+# blocks with a single predecessor are emitted inline in it, up to this
+# depth; Python's tokenizer rejects more than 100 indentation levels
+MAX_INLINE_DEPTH = 32
+
+
+def input_names(cfg):
+    # names read before any definition: plain identifiers the program never
+    # assigns, and version-0 SSA values live into the start block. Phis no
+    # instruction reads, even through other phis, don't count: minimal SSA
+    # puts one at a loop header for every variable the body assigns, with
+    # an incoming version 0 even when the body assigns it before use
+    ssa = len(cfg.ssa_values) > 0
+    live_phis = cfg.live_phis() if ssa else set()
+    names = set()
+    for block in cfg.blocks:
+        for instr in block.instr:
+            if isinstance(instr, PhiNode) and instr not in live_phis:
+                continue
+            names.update(name for name in instr.uses() if not isinstance(name, Value))
+    if ssa:
+        live_in, _ = cfg.compute_value_liveness(live_phis)
+        names.update(value.var for value in live_in.get(cfg.start, ()) if value.version == 0)
+    return sorted(names)
+
+
+def interpret(cfg, inputs, limit=None, visits=None):
+    # reference tree-walking interpreter; works on SSA and non-SSA CFGs.
+    # visits, if given, is a Counter of times each block was entered
+    labels = {block.name: block for block in cfg.blocks}
+    env = {}
+    required = None
+
+    def missing(var):
+        # a version 0 left out of the inputs: fine if only dead phis read it
+        nonlocal required
+        if required is None:
+            required = set(input_names(cfg))
+        if var in required:
+            raise KeyError(var)
+        return None
+
+    def evaluate(expr):
+        if isinstance(expr, BinOp):
+            return BINOPS[expr.op](evaluate(expr.lhs), evaluate(expr.rhs))
+        if isinstance(expr, Value):
+            if expr in env:
+                return env[expr]
+            if expr.version == 0:
+                return inputs[expr.var] if expr.var in inputs else missing(expr.var)
+            return None
+        if isinstance(expr, str):
+            if expr == "undef":
+                return None
+            return env[expr] if expr in env else inputs[expr]
+        return expr
+
+    block, pred = cfg.start, None
+    steps = 0
+    while True:
+        steps += 1
+        if limit is not None and steps > limit:
+            raise RuntimeError(f"step limit {limit} exceeded")
+        if visits is not None:
+            visits[block] += 1
+        phis = []
+        for instr in block.instr:
+            if isinstance(instr, PhiNode):
+                value = next((v for v, p in instr.incoming if p is pred), "undef")
+                phis.append((instr.name, evaluate(value)))
+        for name, value in phis:
+            env[name] = value
+
+        target = None
+        for instr in block.instr:
+            if isinstance(instr, Var):
+                env[instr.name] = evaluate(instr.val)
+            elif isinstance(instr, ReturnStmt):
+                return evaluate(instr.retval)
+            elif isinstance(instr, IfStmt):
+                goto = instr.thengoto if evaluate(instr.condition) else instr.elsegoto
+                target = labels[goto.goto]
+                break
+            elif isinstance(instr, GotoStmt):
+                target = labels[instr.goto]
+                break
+        if target is None:
+            if not block.succ:
+                return None
+            target = block.succ[0]
+        block, pred = target, block
+
+
+class Lowering:
+    # SSA CFG -> source of one Python function. Blocks are laid out in RPO;
+    # a block with a single predecessor is emitted inline at its only
+    # incoming edge, the rest become numbered labels. Acyclic CFGs run the
+    # labels as a straight sequence of guarded sections, cyclic ones as a
+    # while loop dispatching through a binary search on the label number.
+    # Phis become parallel tuple assignments on each incoming edge.
+    def __init__(self, cfg, name="ir_function"):
+        self.cfg = cfg
+        self.name = name
+        self.blocks = {block.name: block for block in cfg.blocks}
+        self.rpo = reverse_postorder(cfg.start, lambda b: b.succ)
+        order = {block: i for i, block in enumerate(self.rpo)}
+        self.cyclic = any(order[succ] <= order[block] for block in self.rpo for succ in block.succ)
+        self.labels = {}
+        for block in self.rpo:
+            if not self.inlined(block):
+                self.labels[block] = len(self.labels)
+        # the function takes exactly input_names; other version-0 values
+        # only reach dead phis and read as None
+        self.params = input_names(cfg)
+        self.inputs = set(self.params)
+
+    def inlined(self, block):
+        return block is not self.cfg.start and len(block.pred) == 1
+
+    def param(self, name):
+        return f"p_{name}" if name in self.inputs else "None"
+
+    def operand(self, value):
+        if isinstance(value, Value):
+            if value.version == 0:
+                return self.param(value.var)
+            return f"v{value.id}"
+        if isinstance(value, str):
+            return "None" if value == "undef" else self.param(value)
+        if isinstance(value, BinOp):
+            return f"({self.expression(value)})"
+        if isinstance(value, float) and not math.isfinite(value):
+            return f"float('{value}')"
+        if isinstance(value, (int, float)) and value < 0:
+            return f"({value!r})"
+        return repr(value)
+
+    def expression(self, expr, condition=False):
+        if not isinstance(expr, BinOp):
+            return self.operand(expr)
+        code = f"{self.operand(expr.lhs)} {expr.op} {self.operand(expr.rhs)}"
+        if expr.op in COMPARISONS and not condition:
+            return f"int({code})"
+        return code
+
+    def emit_block(self, block, out, indent, depth):
+        pad = "    " * indent
+        for instr in block.instr:
+            if isinstance(instr, PhiNode):
+                continue
+            if isinstance(instr, Var):
+                if not isinstance(instr.name, Value):
+                    raise ValueError("compile_cfg needs an SSA CFG (run build_ssa first)")
+                out.append(f"{pad}v{instr.name.id} = {self.expression(instr.val)}")
+            elif isinstance(instr, ReturnStmt):
+                out.append(f"{pad}return {self.operand(instr.retval)}")
+                return
+            elif isinstance(instr, IfStmt):
+                out.append(f"{pad}if {self.expression(instr.condition, condition=True)}:")
+                self.emit_edge(block, self.blocks[instr.thengoto.goto], out, indent + 1, depth)
+                out.append(f"{pad}else:")
+                self.emit_edge(block, self.blocks[instr.elsegoto.goto], out, indent + 1, depth)
+                return
+            elif isinstance(instr, GotoStmt):
+                self.emit_edge(block, self.blocks[instr.goto], out, indent, depth)
+                return
+        if block.succ:
+            self.emit_edge(block, block.succ[0], out, indent, depth)
+        else:
+            out.append(f"{pad}return None")
+
+    def emit_edge(self, pred, succ, out, indent, depth):
+        pad = "    " * indent
+        targets, sources = [], []
+        for instr in succ.instr:
+            if isinstance(instr, PhiNode):
+                value = next((v for v, p in instr.incoming if p is pred), "undef")
+                targets.append(f"v{instr.name.id}")
+                sources.append(self.operand(value))
+        if targets:
+            out.append(f"{pad}{', '.join(targets)} = {', '.join(sources)}")
+        if succ not in self.labels and depth < MAX_INLINE_DEPTH:
+            self.emit_block(succ, out, indent, depth + 1)
+            return
+        if succ not in self.labels:
+            self.labels[succ] = len(self.labels)
+        out.append(f"{pad}label = {self.labels[succ]}")
+
+    def emit_sections(self):
+        # forced labels (MAX_INLINE_DEPTH) only appear while emitting; a
+        # block that got one is emitted as its own section on the next round,
+        # which can only shorten inline chains, so this settles quickly
+        while True:
+            count = len(self.labels)
+            sections = []
+            for block in self.rpo:
+                if block in self.labels:
+                    section = []
+                    self.emit_block(block, section, 0, 0)
+                    sections.append((self.labels[block], section))
+            if len(self.labels) == count:
+                return sections
+
+    def emit_dispatch(self, sections, out, indent):
+        pad = "    " * indent
+        if len(sections) == 1:
+            out.extend(pad + line for line in sections[0][1])
+            return
+        mid = len(sections) // 2
+        out.append(f"{pad}if label < {sections[mid][0]}:")
+        self.emit_dispatch(sections[:mid], out, indent + 1)
+        out.append(f"{pad}else:")
+        self.emit_dispatch(sections[mid:], out, indent + 1)
+
+    def lower(self):
+        sections = self.emit_sections()
+        body = []
+        if len(sections) > 1:
+            body.append("    label = 0")
+        if self.cyclic:
+            body.append("    while True:")
+            self.emit_dispatch(sorted(sections, key=lambda section: section[0]), body, 2)
+        else:
+            # every jump goes forward in RPO, so one pass over the guarded
+            # sections in that order runs them all
+            for i, (label, section) in enumerate(sections):
+                indent = "    " if i == 0 else "        "
+                if i:
+                    body.append(f"    if label == {label}:")
+                body.extend(indent + line for line in section)
+        header = f"def {self.name}({', '.join('p_' + name for name in self.params)}):"
+        return "\n".join([header] + body) + "\n", self.params
+
+
+def compile_cfg(cfg, name="ir_function"):
+    # the returned function takes the program's inputs positionally, in the
+    # order of fn.params (sorted names); fn.source holds the generated code
+    source, params = Lowering(cfg, name).lower()
+    namespace = {}
+    exec(compile(source, f"<ir:{name}>", "exec"), namespace)
+    fn = namespace[name]
+    fn.params = tuple(params)
+    fn.source = source
+    return fn
+
+
+def call(fn, inputs):
+    return fn(*[inputs[name] for name in fn.params])
+
+
+class FunctionCache:
+    # compiled functions keyed on the CFG's serialized form, so structurally
+    # identical CFGs (e.g. reloaded from the compilation cache) share one
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.functions = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, cfg):
+        key = encode_cfg(cfg)
+        fn = self.functions.get(key)
+        if fn is not None:
+            self.hits += 1
+            self.functions.move_to_end(key)
+            return fn
+        self.misses += 1
+        fn = self.functions[key] = compile_cfg(cfg)
+        if len(self.functions) > self.maxsize:
+            self.functions.popitem(last=False)
+        return fn
+
+    def clear(self):
+        self.functions.clear()
+
+
+DEFAULT_CACHE = FunctionCache()
+
+
+def compile_cached(cfg):
+    return DEFAULT_CACHE.get(cfg)
@@ -1,12 +1,101 @@
+import sys
+
+
+class Value:
+    __slots__ = ('id', 'var', 'version', 'defn')
+
+    def __init__(self, id, var, version, defn=None):
+        self.id = id
+        self.var = var
+        self.version = version
+        self.defn = defn
+
+    def __repr__(self):
+        if self.var[-1:].isdigit():
+            return f"{self.var}.{self.version}"
+        return f"{self.var}{self.version}"
+
+
+class ValueTable:
+    def __init__(self):
+        self.values = []
+
+    def new(self, var, version, defn=None):
+        value = Value(len(self.values), var, version, defn)
+        self.values.append(value)
+        return value
+
+    def __getitem__(self, id):
+        return self.values[id]
+
+    def __contains__(self, value):
+        return isinstance(value, Value) and value.id < len(self.values) and self.values[value.id] is value
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __len__(self):
+        return len(self.values)
+
+
+# binding power of each binary operator; all of them are left-associative
+PRECEDENCE = {
+    '==': 1, '!=': 1,
+    '<': 2, '>': 2, '<=': 2, '>=': 2,
+    '+': 3, '-': 3,
+    '*': 4, '/': 4,
+}
+
+
+def is_ref(value):
+    return isinstance(value, (str, Value))
+
+
+def operand_uses(value, out):
+    if isinstance(value, Value):
+        out.append(value)
+    elif isinstance(value, str):
+        if value != "undef":
+            out.append(value)
+    elif isinstance(value, Node):
+        out.extend(value.uses())
+    return out
+
+
+def defined_value(instr):
+    if isinstance(instr, (Var, PhiNode)) and isinstance(instr.name, Value):
+        return instr.name
+    return None
+
+
+def map_operand(value, fn):
+    if isinstance(value, Node):
+        value.map_uses(fn)
+        return value
+    if is_ref(value):
+        return fn(value)
+    return value
+
+
 class Node:
+    __slots__ = ('name',)
+
     def __init__(self, name=None):
         self.name = name
 
+    def uses(self):
+        return []
+
+    def map_uses(self, fn):
+        pass
+
     def replace_uses(self, name, value):
         return False
 
 
 class Var(Node):
+    __slots__ = ('val',)
+
     def __init__(self, name, val):
         super().__init__(name)
         self.val = val
@@ -14,9 +103,15 @@ class Var(Node):
     def __repr__(self):
         return f"{self.name}={self.val}"
 
+    def uses(self):
+        return operand_uses(self.val, [])
+
+    def map_uses(self, fn):
+        self.val = map_operand(self.val, fn)
+
     def replace_uses(self, name, value):
         changed = False
-        if isinstance(self.val, str) and self.val == name:
+        if is_ref(self.val) and self.val == name:
             self.val = value
             changed = True
         elif isinstance(self.val, Node):
@@ -25,23 +120,38 @@ class Var(Node):
 
 
 class BinOp(Node):
+    __slots__ = ('lhs', 'rhs', 'op')
+
     def __init__(self, lhs, rhs, op):
         super().__init__(None)
         self.lhs = lhs
         self.rhs = rhs
-        self.op = op
+        self.op = sys.intern(op)
 
     def __repr__(self):
-        return f"{self.lhs} {self.op} {self.rhs}"
+        precedence = PRECEDENCE.get(self.op, 0)
+        lhs, rhs = self.lhs, self.rhs
+        if isinstance(lhs, BinOp) and PRECEDENCE.get(lhs.op, 0) < precedence:
+            lhs = f"({lhs})"
+        if isinstance(rhs, BinOp) and PRECEDENCE.get(rhs.op, 0) <= precedence:
+            rhs = f"({rhs})"
+        return f"{lhs} {self.op} {rhs}"
+
+    def uses(self):
+        return operand_uses(self.rhs, operand_uses(self.lhs, []))
+
+    def map_uses(self, fn):
+        self.lhs = map_operand(self.lhs, fn)
+        self.rhs = map_operand(self.rhs, fn)
 
     def replace_uses(self, name, value):
         changed = False
-        if isinstance(self.lhs, str) and self.lhs == name:
+        if is_ref(self.lhs) and self.lhs == name:
             self.lhs = value
             changed = True
         elif isinstance(self.lhs, Node):
             changed |= self.lhs.replace_uses(name, value)
-        if isinstance(self.rhs, str) and self.rhs == name:
+        if is_ref(self.rhs) and self.rhs == name:
             self.rhs = value
             changed = True
         elif isinstance(self.rhs, Node):
@@ -50,6 +160,8 @@ class BinOp(Node):
 
 
 class IfStmt(Node):
+    __slots__ = ('condition', 'thengoto', 'elsegoto')
+
     def __init__(self, condition, thengoto, elsegoto):
         super().__init__(None)
         self.condition = condition
@@ -59,9 +171,15 @@ class IfStmt(Node):
     def __repr__(self):
         return f"if({self.condition}) {self.thengoto}\nelse {self.elsegoto}"
 
+    def uses(self):
+        return operand_uses(self.condition, [])
+
+    def map_uses(self, fn):
+        self.condition = map_operand(self.condition, fn)
+
     def replace_uses(self, name, value):
         changed = False
-        if isinstance(self.condition, str) and self.condition == name:
+        if is_ref(self.condition) and self.condition == name:
             self.condition = value
             changed = True
         elif isinstance(self.condition, Node):
@@ -69,6 +187,8 @@ class IfStmt(Node):
         return changed
 
 class ReturnStmt(Node):
+    __slots__ = ('base_name', 'retval')
+
     def __init__(self, base_name):
         super().__init__(base_name)
         self.base_name = base_name
@@ -77,9 +197,15 @@ class ReturnStmt(Node):
     def __repr__(self):
         return f"return {self.retval}"
 
+    def uses(self):
+        return operand_uses(self.retval, [])
+
+    def map_uses(self, fn):
+        self.retval = map_operand(self.retval, fn)
+
     def replace_uses(self, name, value):
         changed = False
-        if isinstance(self.retval, str) and self.retval == name:
+        if is_ref(self.retval) and self.retval == name:
             self.retval = value
             changed = True
         elif isinstance(self.retval, Node):
@@ -88,6 +214,8 @@ class ReturnStmt(Node):
 
 
 class GotoStmt(Node):
+    __slots__ = ('goto',)
+
     def __init__(self, goto):
         super().__init__(None)
         self.goto = goto
@@ -106,14 +234,20 @@ class GotoStmt(Node):
 
 
 class PhiNode(Node):
+    __slots__ = ('var', 'incoming')
+
     def __init__(self, var):
         super().__init__(var)
         self.name = var
+        self.var = var
         self.incoming = []
 
     def add_incoming(self, value, pred):
         self.incoming.append((value, pred))
 
+    def remove_incoming(self, pred):
+        self.incoming = [(v, p) for v, p in self.incoming if p is not pred]
+
     def update_incoming(self, pred, value):
         for i, (v, p) in enumerate(self.incoming):
             if p == pred:
@@ -123,10 +257,19 @@ class PhiNode(Node):
         incomings = ', '.join(f"{v}@{p.name}" for v, p in self.incoming)
         return f"{self.name} = phi({incomings})"
 
+    def uses(self):
+        out = []
+        for v, _ in self.incoming:
+            operand_uses(v, out)
+        return out
+
+    def map_uses(self, fn):
+        self.incoming = [(map_operand(v, fn), p) for v, p in self.incoming]
+
     def replace_uses(self, name, value):
         changed = False
         for i, (v, p) in enumerate(self.incoming):
-            if isinstance(v, str) and v == name:
+            if is_ref(v) and v == name:
                 self.incoming[i] = (value, p)
                 changed = True
             elif isinstance(v, Node):
@@ -135,12 +278,17 @@ class PhiNode(Node):
 
 
 class BasicBlock(Node):
+    __slots__ = ('instr', 'pred', 'succ')
+
     def __init__(self, name, instr=None):
         super().__init__(name)
         self.instr = instr or []
         self.pred = []
         self.succ = []
-        self.variables = set(stmt.name for stmt in self.instr if isinstance(stmt, Var))
+
+    @property
+    def variables(self):
+        return set(stmt.name for stmt in self.instr if isinstance(stmt, Var))
 
     def __repr__(self):
         instr_str = "\n ".join(str(i) for i in self.instr)
@@ -149,6 +297,11 @@ class BasicBlock(Node):
     def defined(self, var):
         return any(isinstance(instr, Var) and instr.name == var for instr in self.instr)
 
+    def terminator(self):
+        if self.instr and isinstance(self.instr[-1], (IfStmt, GotoStmt, ReturnStmt)):
+            return self.instr[-1]
+        return None
+
     def inserted(self, var):
         return any(isinstance(instr, PhiNode) and instr.name == var for instr in self.instr)
 
@@ -158,6 +311,15 @@ class BasicBlock(Node):
             phi.add_incoming("undef", pred)
         self.instr.insert(0, phi)
 
+    def insert_phis(self, variables):
+        phis = []
+        for var in variables:
+            phi = PhiNode(var)
+            for pred in self.pred:
+                phi.add_incoming("undef", pred)
+            phis.append(phi)
+        self.instr[0:0] = phis
+
     def add_pred(self, *blocks):
         self.pred.extend(blocks)
 
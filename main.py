@@ -1,39 +1,271 @@
+import os
 import sys
+import glob
+import argparse
 from ir import *
-from cfg import CFG
-from passes import PassManager
-from parser import parse_file
-
-
-def process_file(filename):    
-    cfg = parse_file(filename)
-    
-    cfg.compute_dominators()
-    cfg.compute_frontiers()
-    cfg.calculate_phi()
-    cfg.rename()
-    cfg.compute_ssa_uses()
-    
-    pm = PassManager(cfg)
-    pm.sccp(cfg)
-    pm.dce(cfg)
-    cfg.print()
+from cfg import CFG, SSA_MODES, SSA_CONSTRUCTIONS
+from passes import PassManager, DEFAULT_PIPELINE, parse_pipeline
+from stats import Stats, NULL_STATS
+from parser import Parser
+from cache import CompilationCache, DEFAULT_CACHE_SIZE, cache_key
+import serialize
+from dot import save_dot, CLUSTER_MODES
 
 
-if __name__ == '__main__':
-    if len(sys.argv) > 1:
-        filename = sys.argv[1]
+def optimize(cfg, ssa_mode="minimal", phi_stats=False, adce=False, passes=DEFAULT_PIPELINE, stats=NULL_STATS):
+    pipeline = parse_pipeline(passes)
+    if adce:
+        pipeline = ['adce' if name == 'dce' else name for name in pipeline]
+
+    if cfg.left_ssa:
+        # reloaded after out-of-ssa: values are assigned more than once, so
+        # neither the SSA passes nor build_ssa apply
+        if pipeline:
+            raise ValueError("CFG has been taken out of SSA form and can't be optimized again "
+                             "(pass --passes= to run it as is)")
+        return cfg
+
+    pm = PassManager(cfg, stats)
+    # a CFG built with direct construction or reloaded from a serialized
+    # file is already in SSA form
+    if not len(cfg.ssa_values):
+        if phi_stats:
+            pm.analyses.get('frontiers')
+            minimal = cfg.count_phis("minimal")
+        inserted = pm.build_ssa(ssa_mode)
+        if phi_stats:
+            print(f"phis: {inserted} inserted ({ssa_mode}), {minimal} in minimal SSA", file=sys.stderr)
+
+    for name, result in pm.run_pipeline(pipeline):
+        if name == 'out-of-ssa' and phi_stats:
+            inserted, coalesced = result
+            print(f"copies: {inserted} inserted leaving SSA, {coalesced} coalesced away", file=sys.stderr)
+    return cfg
+
+
+def parse_source(code, construction="frontiers", phi_stats=False, stats=NULL_STATS):
+    # returns (cfg, instructions parsed); "direct" construction hands back
+    # a CFG already in SSA form
+    direct = construction == "direct"
+    with stats.timer('parse'):
+        cfg = Parser(code, ssa=direct).parse()
+    parsed = cfg.instruction_count()
+    if direct:
+        phis = sum(isinstance(instr, PhiNode) for block in cfg.blocks for instr in block.instr)
+        parsed -= phis
+        stats.bump('ssa.phis_inserted', phis)
+        stats.bump('ssa.values', len(cfg.ssa_values))
+        if phi_stats:
+            print(f"phis: {phis} placed while parsing", file=sys.stderr)
+    stats.bump('parse.instructions', parsed)
+    return cfg, parsed
+
+
+def compile_file(filename, ssa_mode="minimal", phi_stats=False, adce=False, passes=DEFAULT_PIPELINE,
+                 stats=NULL_STATS, cache=None, construction="frontiers"):
+    # returns (cfg, instructions parsed); a cache hit reports the count
+    # stored with the entry
+    if serialize.is_serialized(filename):
+        with stats.timer('load'):
+            cfg = serialize.load(filename)
+        return optimize(cfg, ssa_mode, phi_stats, adce, passes, stats), 0
+
+    with open(filename, 'r') as f:
+        code = f.read()
+    if cache is None:
+        cfg, parsed = parse_source(code, construction, phi_stats, stats)
+        return optimize(cfg, ssa_mode, phi_stats, adce, passes, stats), parsed
+
+    key = cache_key(code, ssa_mode=ssa_mode, adce=adce, passes=passes, construction=construction)
+    with stats.timer('cache.load'):
+        entry = cache.load(key)
+    if entry is not None:
+        stats.bump('cache.hits')
+        return entry
+    stats.bump('cache.misses')
+
+    cfg, parsed = parse_source(code, construction, phi_stats, stats)
+    optimize(cfg, ssa_mode, phi_stats, adce, passes, stats)
+    with stats.timer('cache.store'):
+        cache.store(key, cfg, parsed)
+    return cfg, parsed
+
+
+def process_file(filename, ssa_mode="minimal", phi_stats=False, adce=False, passes=DEFAULT_PIPELINE,
+                 stats=NULL_STATS, cache=None, save=None, quiet=False, dot=None, dot_options=None,
+                 construction="frontiers"):
+    cfg, _ = compile_file(filename, ssa_mode, phi_stats, adce, passes, stats, cache, construction)
+    if save:
+        with stats.timer('save'):
+            serialize.save(cfg, save)
+    if dot:
+        with stats.timer('dot'):
+            save_dot(cfg, dot, **(dot_options or {}))
+    if not quiet:
+        with stats.timer('print'):
+            cfg.print()
+    return cfg
+
+
+def input_arg(text):
+    name, sep, value = text.partition('=')
+    if not sep or not name:
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE, got '{text}'")
+    try:
+        return name, int(value)
+    except ValueError:
+        pass
+    try:
+        return name, float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{value}' is not a number")
+
+
+def run_program(cfg, assignments, stats=NULL_STATS):
+    from engine import compile_cached, input_names
+
+    inputs = dict(assignments)
+    missing = [name for name in input_names(cfg) if name not in inputs]
+    if missing:
+        raise ValueError(f"missing input(s): {', '.join(missing)} (pass --input NAME=VALUE)")
+    with stats.timer('compile'):
+        fn = compile_cached(cfg)
+    with stats.timer('run'):
+        return fn(*[inputs[name] for name in fn.params])
+
+
+def pipeline_arg(spec):
+    try:
+        parse_pipeline(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return spec
+
+
+def parse_args(argv):
+    argparser = argparse.ArgumentParser(description="Compile an IR source file.")
+    argparser.add_argument('filenames', nargs='*', default=['test.ir'],
+                           help="files, directories or glob patterns")
+    argparser.add_argument('--ssa', choices=SSA_MODES, default='minimal',
+                           help="phi placement strategy")
+    argparser.add_argument('--ssa-construction', choices=SSA_CONSTRUCTIONS, default='frontiers',
+                           help="build SSA after parsing from dominance frontiers, or directly in the parser")
+    argparser.add_argument('--phi-stats', action='store_true',
+                           help="report inserted phis against minimal SSA, and copies made by out-of-ssa")
+    argparser.add_argument('--adce', action='store_true',
+                           help="use control dependence to remove dead branches")
+    argparser.add_argument('--passes', default=DEFAULT_PIPELINE, type=pipeline_arg,
+                           help=f"comma-separated optimization pipeline (default: {DEFAULT_PIPELINE})")
+    argparser.add_argument('--time-passes', action='store_true',
+                           help="print wall/CPU time and counters for every stage to stderr")
+    argparser.add_argument('--stats-json', default=None, metavar='FILE',
+                           help="write stage timings and counters as JSON")
+    argparser.add_argument('--trace-memory', action='store_true',
+                           help="record tracemalloc peak memory per stage (slow)")
+    argparser.add_argument('-j', '--jobs', type=int, default=None,
+                           help="worker processes for batch mode (default: all cores)")
+    argparser.add_argument('--chunksize', type=int, default=None,
+                           help="files handed to a worker at a time")
+    argparser.add_argument('-o', '--out-dir', default=None,
+                           help="write each result to OUT_DIR/<file>.out")
+    argparser.add_argument('--jsonl', default=None,
+                           help="stream results as JSON lines to a file ('-' for stdout)")
+    argparser.add_argument('--cache-dir', default=os.environ.get('IR_CACHE_DIR'),
+                           help="reuse optimized CFGs stored under this directory (default: $IR_CACHE_DIR)")
+    argparser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE // (1024 * 1024), metavar='MB',
+                           help="evict least recently used entries above this size")
+    argparser.add_argument('--no-cache', action='store_true',
+                           help="ignore --cache-dir and $IR_CACHE_DIR")
+    argparser.add_argument('--cache-stats', action='store_true',
+                           help="print cache hits and misses to stderr")
+    argparser.add_argument('--save', default=None, metavar='FILE',
+                           help="also write the optimized CFG to FILE (binary if it ends in .irb, text otherwise); "
+                                "saved files are accepted as input")
+    argparser.add_argument('--dot', default=None, metavar='FILE',
+                           help="also write the optimized CFG to FILE in graphviz DOT format")
+    argparser.add_argument('--dot-max-lines', type=int, default=None, metavar='N',
+                           help="show at most N instructions per DOT node")
+    argparser.add_argument('--dot-max-width', type=int, default=None, metavar='N',
+                           help="truncate DOT label lines to N characters")
+    argparser.add_argument('--dot-collapse', action='store_true',
+                           help="draw each straight-line chain of blocks as one DOT node")
+    argparser.add_argument('--dot-cluster', choices=CLUSTER_MODES, default=None,
+                           help="group DOT nodes by dominator subtree or natural loop")
+    argparser.add_argument('-q', '--quiet', action='store_true',
+                           help="don't print the CFG")
+    argparser.add_argument('--run', action='store_true',
+                           help="compile the optimized program to Python and print its result")
+    argparser.add_argument('--input', action='append', type=input_arg, default=[], metavar='NAME=VALUE',
+                           help="value of an undefined name for --run (repeatable)")
+    return argparser.parse_args(argv)
+
+
+def is_batch(args):
+    if len(args.filenames) > 1 or args.jobs or args.out_dir or args.jsonl:
+        return True
+    return any(os.path.isdir(f) or glob.has_magic(f) for f in args.filenames)
+
+
+def report_stats(args, stats):
+    if args.time_passes:
+        print(stats.format(), file=sys.stderr)
+    if args.stats_json:
+        stats.write_json(args.stats_json)
+
+
+def dot_options(args):
+    return {'max_lines': args.dot_max_lines, 'max_width': args.dot_max_width,
+            'collapse': args.dot_collapse, 'cluster': args.dot_cluster}
+
+
+def open_cache(args):
+    if args.no_cache or not args.cache_dir:
+        return None
+    return CompilationCache(args.cache_dir, args.cache_size * 1024 * 1024)
+
+
+def main(argv):
+    args = parse_args(argv)
+    if args.time_passes or args.stats_json or args.trace_memory:
+        stats = Stats(memory=args.trace_memory)
     else:
-        filename = 'test.ir'
-    
+        stats = NULL_STATS
+    cache = open_cache(args)
+
+    if is_batch(args):
+        if args.run or args.save or args.dot:
+            print("Error: --run, --save and --dot take a single input file")
+            return 1
+        from batch import collect_inputs, run_batch, print_summary
+        files = collect_inputs(args.filenames)
+        summary, errors = run_batch(files, jobs=args.jobs, chunksize=args.chunksize,
+                                    out_dir=args.out_dir, jsonl=args.jsonl, stats=stats,
+                                    cache=cache, quiet=args.quiet, ssa_mode=args.ssa, adce=args.adce,
+                                    passes=args.passes, construction=args.ssa_construction)
+        print_summary(summary, errors, cache_stats=args.cache_stats)
+        report_stats(args, stats)
+        return 1 if errors else 0
+
+    filename = args.filenames[0]
     try:
-        process_file(filename)
+        cfg = process_file(filename, args.ssa, args.phi_stats, args.adce, args.passes, stats, cache,
+                           args.save, args.quiet, args.dot, dot_options(args), args.ssa_construction)
+        if args.run:
+            print(f"result: {run_program(cfg, args.input, stats)}")
+        report_stats(args, stats)
+        if cache is not None and args.cache_stats:
+            print(cache.format(), file=sys.stderr)
     except FileNotFoundError:
         print(f"Error: File '{filename}' not found.")
         print("Usage: python main.py [filename]")
-        sys.exit(1)
+        return 1
     except Exception as e:
         print(f"Error processing file: {e}")
         import traceback
         traceback.print_exc()
-        sys.exit(1)
\ No newline at end of file
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
\ No newline at end of file
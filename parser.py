@@ -1,90 +1,175 @@
 import re
-from ir import Var, BinOp, IfStmt, ReturnStmt, GotoStmt, BasicBlock
-from cfg import CFG
+import sys
+from collections import deque, namedtuple
+from ir import Var, BinOp, IfStmt, ReturnStmt, GotoStmt, BasicBlock, ValueTable, PRECEDENCE
+from cfg import CFG, SSABuilder
+
+
+Token = namedtuple('Token', 'type value line col')
+
+KEYWORDS = {
+    'var': 'VAR',
+    'if': 'IF',
+    'else': 'ELSE',
+    'while': 'WHILE',
+    'return': 'RETURN',
+}
+
+TOKEN_SPEC = [
+    ('IDENTIFIER', r'[a-zA-Z_][a-zA-Z0-9_]*'),
+    ('NUMBER', r'\d+'),
+    ('OPERATOR', r'[+\-*/<>!=]=|[+\-*/<>=]'),
+    ('PUNCTUATION', r'[{}();]'),
+    ('NEWLINE', r'\n'),
+]
+
+# expression trees deeper than this are split into temporaries, so later
+# passes can walk them recursively
+MAX_EXPR_DEPTH = 64
+
+TOKEN_RE = re.compile('|'.join(f'(?P<{name}>{pattern})' for name, pattern in TOKEN_SPEC))
+
+
+def tokenize(code):
+    line = 1
+    line_start = 0
+    keywords = KEYWORDS
+    intern = sys.intern
+    for match in TOKEN_RE.finditer(code):
+        token_type = match.lastgroup
+        value = match.group()
+        if token_type == 'NEWLINE':
+            line += 1
+            line_start = match.end()
+            continue
+        if token_type == 'IDENTIFIER':
+            token_type = keywords.get(value, token_type)
+            value = intern(value)
+        yield Token(token_type, value, line, match.start() - line_start + 1)
+    yield Token('EOF', None, line, len(code) - line_start + 1)
 
 
 class Parser:
-    def __init__(self, code):
+    # with ssa=True the CFG comes out in SSA form, built as it is parsed
+    def __init__(self, code, ssa=False):
         self.code = code
-        self.tokens = []
+        self.ssa = SSABuilder(ValueTable()) if ssa else None
+        self.tokens = iter(())
+        self.lookahead = deque()
         self.pos = 0
         self.block_counter = 0
-        
+        self.temps = []
+        self.temp_counter = 0
+
     def tokenize(self):
-        patterns = [
-            (r'\bvar\b', 'VAR'),
-            (r'\bif\b', 'IF'),
-            (r'\belse\b', 'ELSE'),
-            (r'\breturn\b', 'RETURN'),
-            (r'\b[a-zA-Z_][a-zA-Z0-9_]*\b', 'IDENTIFIER'),
-            (r'\d+', 'NUMBER'),
-            (r'[+\-*/<>]=?|=', 'OPERATOR'),
-            (r'[{}();]', 'PUNCTUATION'),
-        ]
-        
-        regex = '|'.join(f'({pattern})' for pattern, _ in patterns)
-        
-        self.tokens = []
-        for match in re.finditer(regex, self.code):
-            token_type = None
-            for i, (pattern, ttype) in enumerate(patterns):
-                if match.group(i + 1):
-                    token_type = ttype
-                    break
-            
-            if token_type:
-                value = match.group(0)
-                if not value.strip():
-                    continue
-                self.tokens.append((token_type, value.strip()))
-        
-        self.tokens.append(('EOF', None))
-        
-    def peek(self):
-        if self.pos < len(self.tokens):
-            return self.tokens[self.pos]
-        return ('EOF', None)
-    
+        self.tokens = tokenize(self.code)
+        self.lookahead.clear()
+        self.pos = 0
+
+    def peek(self, offset=0):
+        lookahead = self.lookahead
+        while len(lookahead) <= offset:
+            lookahead.append(next(self.tokens, None) or Token('EOF', None, 0, 0))
+        return lookahead[offset]
+
     def consume(self, expected_type=None):
-        if self.pos >= len(self.tokens):
-            return ('EOF', None)
-        token = self.tokens[self.pos]
-        if expected_type and token[0] != expected_type:
-            raise SyntaxError(f"Expected {expected_type}, got {token[0]}")
+        token = self.peek()
+        if token.type == 'EOF':
+            return token
+        if expected_type and token.type != expected_type:
+            raise self.error(f"Expected {expected_type}, got {token.type}", token)
+        self.lookahead.popleft()
         self.pos += 1
         return token
-    
+
     def expect(self, token_type):
         token = self.consume()
-        if token[0] != token_type:
-            raise SyntaxError(f"Expected {token_type}, got {token[0]}")
+        if token.type != token_type:
+            raise self.error(f"Expected {token_type}, got {token.type}", token)
         return token
-    
+
+    def error(self, message, token):
+        return SyntaxError(f"{message} at line {token.line}, column {token.col}")
+
     def new_block_name(self):
         name = f"bb{self.block_counter}"
         self.block_counter += 1
         return name
+
+    def new_temp(self, value):
+        # '%' can't start an identifier, so temporaries never clash with source names
+        name = f"%t{self.temp_counter}"
+        self.temp_counter += 1
+        self.temps.append(Var(name, value))
+        return name
+
+    def take_temps(self):
+        temps = self.temps
+        self.temps = []
+        return temps
     
-    def parse_expression(self):
-        token_type, value = self.peek()
-        
-        if token_type == 'NUMBER':
+    def parse_expression(self, condition=False):
+        # precedence climbing with explicit operand and operator stacks, so
+        # neither long operator chains nor deep parentheses use Python frames;
+        # None on the operator stack marks an open parenthesis. Operands are
+        # (expr, tree depth) pairs; subtrees past MAX_EXPR_DEPTH go to
+        # self.temps, which the caller emits ahead of the statement. In a
+        # condition, a ')' past the open parentheses closes the condition
+        operands = []
+        operators = []
+        depth = 0
+
+        def reduce():
+            rhs, rhs_depth = operands.pop()
+            lhs, lhs_depth = operands[-1]
+            expr = BinOp(lhs, rhs, operators.pop())
+            tree_depth = max(lhs_depth, rhs_depth) + 1
+            if tree_depth >= MAX_EXPR_DEPTH:
+                expr, tree_depth = self.new_temp(expr), 0
+            operands[-1] = (expr, tree_depth)
+
+        while True:
+            token = self.peek()
+            while token.type == 'PUNCTUATION' and token.value == '(':
+                self.consume()
+                operators.append(None)
+                depth += 1
+                token = self.peek()
+            if token.type == 'NUMBER':
+                operands.append((int(token.value), 0))
+            elif token.type == 'IDENTIFIER':
+                operands.append((token.value, 0))
+            else:
+                raise self.error(f"Unexpected token in expression: {token.type}", token)
             self.consume()
-            lhs = int(value)
-        elif token_type == 'IDENTIFIER':
+
+            token = self.peek()
+            while depth and token.type == 'PUNCTUATION' and token.value == ')':
+                self.consume()
+                while operators[-1] is not None:
+                    reduce()
+                operators.pop()
+                depth -= 1
+                token = self.peek()
+            if not condition and token.type == 'PUNCTUATION' and token.value == ')':
+                raise self.error("Unexpected ')'", token)
+
+            if token.type != 'OPERATOR' or token.value == '=':
+                break
+            precedence = PRECEDENCE.get(token.value)
+            if precedence is None:
+                raise self.error(f"Unknown operator '{token.value}'", token)
+            while operators and operators[-1] is not None and PRECEDENCE[operators[-1]] >= precedence:
+                reduce()
+            operators.append(token.value)
             self.consume()
-            lhs = value
-        else:
-            raise SyntaxError(f"Unexpected token in expression: {token_type}")
-        
-        if self.peek()[0] == 'OPERATOR' and self.peek()[1] != '=':
-            op_token = self.consume('OPERATOR')
-            op = op_token[1]
-            rhs = self.parse_expression()
-            return BinOp(lhs, rhs, op)
-        
-        return lhs
-    
+
+        if depth:
+            raise self.error("Expected ')'", self.peek())
+        while operators:
+            reduce()
+        return operands[0][0]
+
     def parse_var_decl(self):
         self.expect('VAR')
         name_token = self.expect('IDENTIFIER')
@@ -93,58 +178,120 @@ class Parser:
         value = self.parse_expression()
         return Var(var_name, value)
     
-    def parse_if_statement(self):
-        self.expect('IF')
+    def parse_condition(self):
         self.expect('PUNCTUATION')  # '('
-        
-        condition = self.parse_expression()
+        condition = self.parse_expression(condition=True)
+        temps = self.take_temps()
         self.expect('PUNCTUATION')  # ')'
+        return condition, temps
+
+    def parse_body(self, block):
+        # statements between braces, starting in block; returns the block
+        # control falls out of and the blocks created for nested statements
         self.expect('PUNCTUATION')  # '{'
-        
+        blocks = []
+        while self.peek().type in ('VAR', 'IF', 'WHILE'):
+            block = self.parse_statement(block, blocks)
+        self.expect('PUNCTUATION')  # '}'
+        return block, blocks
+
+    def parse_statement(self, current_block, blocks):
+        token_type = self.peek().type
+        if token_type == 'IF':
+            return self.parse_if_statement(current_block, blocks)
+        if token_type == 'WHILE':
+            return self.parse_while_statement(current_block, blocks)
+
+        instr = self.parse_var_decl()
+        for temp in self.take_temps():
+            self.emit(current_block, temp)
+        self.emit(current_block, instr)
+        # Consume semicolon if present
+        if self.peek()[0] == 'PUNCTUATION' and self.peek()[1] == ';':
+            self.consume()
+        return current_block
+
+    def emit(self, block, instr):
+        if self.ssa is None:
+            block.instr.append(instr)
+        else:
+            self.ssa.emit(block, instr)
+
+    def seal(self, block):
+        # every predecessor of block is known
+        if self.ssa is not None:
+            self.ssa.seal(block)
+
+    def connect(self, src, dst):
+        src.add_succ(dst)
+        dst.add_pred(src)
+
+    def jump(self, src, dst):
+        src.instr.append(GotoStmt(dst.name))
+        self.connect(src, dst)
+
+    def parse_if_statement(self, prev_block, blocks):
+        self.expect('IF')
+        condition, condition_temps = self.parse_condition()
+
         then_block = BasicBlock(self.new_block_name(), [])
         else_block = BasicBlock(self.new_block_name(), [])
         merge_block = BasicBlock(self.new_block_name(), [])
-        
-        then_instrs = []
-        while self.peek()[0] != 'PUNCTUATION' or self.peek()[1] != '}':
-            if self.peek()[0] == 'VAR':
-                then_instrs.append(self.parse_var_decl())
-                if self.peek()[0] == 'PUNCTUATION' and self.peek()[1] == ';':
-                    self.consume()
-            else:
-                break
-        then_block.instr = then_instrs
-        if then_block.instr:
-            then_block.variables = set(stmt.name for stmt in then_block.instr if isinstance(stmt, Var))
-        then_block.add_succ(merge_block)
-        then_block.instr.append(GotoStmt(merge_block.name))
-        
-        self.expect('PUNCTUATION')  # '}'
+
+        # the branch block is named after its arms but wired up first, so
+        # that SSA construction can read through it while they are parsed
+        if_block = BasicBlock(None, [])
+        self.connect(prev_block, if_block)
+        self.seal(if_block)
+        for temp in condition_temps:
+            self.emit(if_block, temp)
+        self.emit(if_block, IfStmt(condition, GotoStmt(then_block.name), GotoStmt(else_block.name)))
+        for arm in (then_block, else_block):
+            self.connect(if_block, arm)
+            self.seal(arm)
+
+        then_end, then_blocks = self.parse_body(then_block)
+        self.jump(then_end, merge_block)
         self.expect('ELSE')
-        self.expect('PUNCTUATION')  # '{'
-        
-        else_instrs = []
-        while self.peek()[0] != 'PUNCTUATION' or self.peek()[1] != '}':
-            if self.peek()[0] == 'VAR':
-                else_instrs.append(self.parse_var_decl())
-                if self.peek()[0] == 'PUNCTUATION' and self.peek()[1] == ';':
-                    self.consume()
-            else:
-                break
-        else_block.instr = else_instrs
-        if else_block.instr:
-            else_block.variables = set(stmt.name for stmt in else_block.instr if isinstance(stmt, Var))
-        else_block.add_succ(merge_block)
-        else_block.instr.append(GotoStmt(merge_block.name))
-        
-        self.expect('PUNCTUATION')  # '}'
-        
-        if_block = BasicBlock(self.new_block_name(), [
-            IfStmt(condition, GotoStmt(then_block.name), GotoStmt(else_block.name))
-        ])
-        if_block.add_succ(then_block, else_block)
-        
-        return if_block, then_block, else_block, merge_block
+        else_end, else_blocks = self.parse_body(else_block)
+        self.jump(else_end, merge_block)
+        self.seal(merge_block)
+
+        if_block.name = self.new_block_name()
+        prev_block.instr.append(GotoStmt(if_block.name))
+
+        blocks.extend([if_block, then_block, *then_blocks, else_block, *else_blocks, merge_block])
+        return merge_block
+
+    def parse_while_statement(self, prev_block, blocks):
+        self.expect('WHILE')
+        condition, condition_temps = self.parse_condition()
+
+        header = BasicBlock(self.new_block_name(), [])
+        body = BasicBlock(self.new_block_name(), [])
+        exit_block = BasicBlock(self.new_block_name(), [])
+
+        # the header stays unsealed until the back edge exists
+        if self.ssa is not None:
+            self.ssa.open_loops += 1
+        self.jump(prev_block, header)
+        # the condition is evaluated in the header on every iteration
+        for temp in condition_temps:
+            self.emit(header, temp)
+        self.emit(header, IfStmt(condition, GotoStmt(body.name), GotoStmt(exit_block.name)))
+        self.connect(header, body)
+        self.connect(header, exit_block)
+        self.seal(body)
+
+        body_end, body_blocks = self.parse_body(body)
+        self.jump(body_end, header)  # back edge
+        self.seal(header)
+        self.seal(exit_block)
+        if self.ssa is not None:
+            self.ssa.open_loops -= 1
+
+        blocks.extend([header, body, *body_blocks, exit_block])
+        return exit_block
     
     def parse_return(self):
         self.expect('RETURN')
@@ -157,49 +304,29 @@ class Parser:
         blocks = []
         current_block = BasicBlock(self.new_block_name(), [])
         blocks.append(current_block)
+        self.seal(current_block)
         
         while self.peek()[0] != 'EOF':
-            token_type, value = self.peek()
+            token_type = self.peek().type
             
-            if token_type == 'VAR':
-                instr = self.parse_var_decl()
-                current_block.instr.append(instr)
-                current_block.variables.add(instr.name)
-                # Consume semicolon if present
-                if self.peek()[0] == 'PUNCTUATION' and self.peek()[1] == ';':
-                    self.consume()
-                    
-            elif token_type == 'IF':
-                prev_block = current_block
-                
-                if_block, then_block, else_block, merge_block = self.parse_if_statement()
-                
-                prev_block.add_succ(if_block)
-                if_block.add_pred(prev_block)
-                prev_block.instr.append(GotoStmt(if_block.name))
-                
-                blocks.extend([if_block, then_block, else_block])
-                
-                # Set up predecessors
-                then_block.add_pred(if_block)
-                else_block.add_pred(if_block)
-                merge_block.add_pred(then_block, else_block)
-                
-                current_block = merge_block
-                blocks.append(merge_block)
+            if token_type in ('VAR', 'IF', 'WHILE'):
+                current_block = self.parse_statement(current_block, blocks)
                 
             elif token_type == 'RETURN':
                 instr = self.parse_return()
-                current_block.instr.append(instr)
+                self.emit(current_block, instr)
                 break
             else:
                 self.consume()
         
-        return CFG(blocks)
+        cfg = CFG(blocks)
+        if self.ssa is not None:
+            cfg.ssa_values = self.ssa.finish()
+        return cfg
 
 
-def parse_file(filename):
+def parse_file(filename, ssa=False):
     with open(filename, 'r') as f:
         code = f.read()
-    parser = Parser(code)
+    parser = Parser(code, ssa)
     return parser.parse()
@@ -1,196 +1,871 @@
-from ir import Var, BinOp, IfStmt, ReturnStmt, PhiNode, BasicBlock, GotoStmt
+import operator
+from collections import Counter, namedtuple
+from ir import Var, BinOp, IfStmt, ReturnStmt, PhiNode, GotoStmt, Value, defined_value
+from cfg import EXIT
+from stats import NULL_STATS
+
+
+TOP, CONST, BOTTOM = 0, 1, 2
+
+BINOPS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+    '<': lambda lhs, rhs: int(lhs < rhs),
+    '>': lambda lhs, rhs: int(lhs > rhs),
+    '<=': lambda lhs, rhs: int(lhs <= rhs),
+    '>=': lambda lhs, rhs: int(lhs >= rhs),
+    '==': lambda lhs, rhs: int(lhs == rhs),
+    '!=': lambda lhs, rhs: int(lhs != rhs),
+}
+
+
+def fold_binop(op, lhs, rhs):
+    # raises KeyError / ArithmeticError when the expression can't be folded
+    return BINOPS[op](lhs, rhs)
+
+
+COMMUTATIVE = frozenset(('+', '*', '==', '!='))
+SWAPPED = {'>': '<', '>=': '<='}
+
+
+def operand_key(value):
+    # total order over operands: SSA values by id, then constants (typed, so
+    # 1 and 1.0 stay apart), then plain names
+    if isinstance(value, Value):
+        return (0, value.id)
+    if isinstance(value, BinOp):
+        return (1, expression_key(value))
+    if isinstance(value, str):
+        return (3, value)
+    return (2, type(value).__name__, value)
+
+
+def expression_key(expr):
+    op, lhs, rhs = expr.op, operand_key(expr.lhs), operand_key(expr.rhs)
+    if op in SWAPPED:
+        op, lhs, rhs = SWAPPED[op], rhs, lhs
+    elif op in COMMUTATIVE and rhs < lhs:
+        lhs, rhs = rhs, lhs
+    return (op, lhs, rhs)
+
+
+def sequentialize_copies(copies, new_temp):
+    # parallel copies (dst, src), all dsts distinct, as an equivalent
+    # sequence. A copy runs once no pending copy still reads its dst; when
+    # only cycles are left, one dst is saved to new_temp(dst) first
+    pending = {dst: src for dst, src in copies if dst is not src}
+    readers = Counter(pending.values())
+    ready = [dst for dst in pending if not readers[dst]]
+    moves = []
+    while pending:
+        while ready:
+            dst = ready.pop()
+            src = pending.pop(dst)
+            moves.append((dst, src))
+            readers[src] -= 1
+            if not readers[src] and src in pending:
+                ready.append(src)
+        if pending:
+            dst = next(iter(pending))
+            temp = new_temp(dst)
+            moves.append((temp, dst))
+            for other, src in pending.items():
+                if src is dst:
+                    pending[other] = temp
+            readers[temp] = readers.pop(dst)
+            ready.append(dst)
+    return moves
+
+
+class AnalysisManager:
+    # analyses that only depend on the CFG shape stay valid until
+    # cfg.shape_version changes, whatever the passes declare
+    ANALYSES = {
+        'dominators': ('compute_dominators', (), True),
+        'frontiers': ('compute_frontiers', ('dominators',), True),
+        'control-deps': ('compute_control_dependence', (), True),
+        'loops': ('compute_loops', ('dominators',), True),
+        'def-use': ('compute_ssa_uses', (), False),
+    }
+
+    def __init__(self, cfg, stats=NULL_STATS):
+        self.cfg = cfg
+        self.stats = stats
+        self.versions = {}
+        self.computed = Counter()
+
+    def is_valid(self, name):
+        cfg = self.cfg
+        if name == 'dominators' and cfg.domtree is not None and cfg.domtree_version == cfg.shape_version:
+            # passes that patch the dominator tree in place keep it current
+            return True
+        if name not in self.versions:
+            return False
+        _, _, shape_only = self.ANALYSES[name]
+        return not shape_only or self.versions[name] == self.cfg.shape_version
+
+    def get(self, name):
+        method, deps, _ = self.ANALYSES[name]
+        for dep in deps:
+            self.get(dep)
+        if not self.is_valid(name):
+            with self.stats.timer(method):
+                getattr(self.cfg, method)()
+            self.computed[name] += 1
+            self.versions[name] = self.cfg.shape_version
+
+    def invalidate(self, preserved=()):
+        for name in list(self.versions):
+            _, _, shape_only = self.ANALYSES[name]
+            if name not in preserved and not shape_only:
+                del self.versions[name]
+
+    def invalidate_all(self):
+        self.versions.clear()
+
+
+PassInfo = namedtuple('PassInfo', 'method requires preserves options')
+
+PASSES = {
+    'sccp': PassInfo('sccp', ('def-use',), ('def-use',), {}),
+    'dce': PassInfo('dce', ('def-use',), ('def-use',), {}),
+    'adce': PassInfo('dce', ('def-use', 'control-deps'), ('def-use',), {'aggressive': True}),
+    'gvn': PassInfo('gvn', ('def-use', 'dominators'), ('def-use',), {}),
+    'licm': PassInfo('licm', ('def-use', 'loops'), ('def-use',), {}),
+    'simplifycfg': PassInfo('simplify_cfg', ('def-use',), ('def-use',), {}),
+    'out-of-ssa': PassInfo('out_of_ssa', (), (), {}),
+}
+
+# passes that leave SSA form; nothing else can run after them
+FINAL_PASSES = frozenset(('out-of-ssa',))
+
+DEFAULT_PIPELINE = "sccp,simplifycfg,gvn,licm,dce,simplifycfg"
+
+
+def parse_pipeline(spec):
+    names = [name.strip() for name in spec.split(',') if name.strip()]
+    for name in names:
+        if name not in PASSES:
+            raise ValueError(f"Unknown pass '{name}' (available: {', '.join(sorted(PASSES))})")
+    for name in names[:-1]:
+        if name in FINAL_PASSES:
+            raise ValueError(f"Pass '{name}' must come last in the pipeline")
+    return names
+
 
 class PassManager:
-    def __init__(self, cfg):
+    def __init__(self, cfg, stats=NULL_STATS):
         self.graph = cfg
-        self.values = cfg.ssa_values
-        self.users = cfg.ssa_users
-
-    def init_lattice(self, graph):
-        lattice = {}
-        for val in graph.ssa_values:
-            if graph.is_const(val):
-                lattice[val] = graph.get_const(val)
-            else:
-                lattice[val] = "top"
-        return lattice
-
-    def dce(self, graph):
-        use_map = {value: len(users) for value, users in self.users.items()}
-
-        dead = set()
-        changed = True
-
-        while changed:
-            changed = False
-            for value, count in use_map.items():
-                if count == 0 and value not in dead:
-                    dead.add(value)
-                    changed = True
-                    for key, user_list in self.users.items():
-                        new_list = []
-                        for instr in user_list:
-                            if getattr(instr, "uses", None) and value in instr.uses():
-                                use_map[key] -= 1
-                                new_list.append(instr)
-                            else:
-                                new_list.append(instr)
-                        self.users[key] = new_list
-
-        for value in dead:
-            graph.remove_def(value)
-
-    def eval_expr(self, expr, lattice):
-        if isinstance(expr, (int, float)):
-            return expr
-        elif isinstance(expr, str):
-            val = lattice.get(expr, "top")
-            return val if val is not None else "top"
-        elif isinstance(expr, BinOp):
-            lhs = self.eval_expr(expr.lhs, lattice)
-            rhs = self.eval_expr(expr.rhs, lattice)
-            if lhs == "top" or rhs == "top":
-                return "top"
-            try:
-                if expr.op == '+':
-                    return lhs + rhs
-                elif expr.op == '-':
-                    return lhs - rhs
-                elif expr.op == '*':
-                    return lhs * rhs
-                elif expr.op == '/':
-                    return lhs / rhs if rhs != 0 else "top"
-                elif expr.op == '<':
-                    return int(lhs < rhs)
-                elif expr.op == '>':
-                    return int(lhs > rhs)
-                elif expr.op == '==':
-                    return int(lhs == rhs)
-                elif expr.op == '!=':
-                    return int(lhs != rhs)
-                else:
-                    return "top"
-            except:
-                return "top"
-        else:
-            return "top"
-
-    def replace_phi_with_const(self, blocks, lattice, executable_blocks):
-        for block in blocks:
-            new_instr = []
+        self.stats = stats
+        self.analyses = AnalysisManager(cfg, stats)
+        self.executable_blocks = set()
+        self.executable_edges = set()
+
+    @property
+    def values(self):
+        return self.graph.ssa_values
+
+    @property
+    def users(self):
+        return self.graph.ssa_users
+
+    def build_ssa(self, mode="minimal"):
+        self.analyses.get('frontiers')
+        with self.stats.timer('calculate_phi'):
+            inserted = self.graph.calculate_phi(mode)
+        with self.stats.timer('rename'):
+            self.graph.rename()
+        self.analyses.invalidate(preserved=('dominators', 'frontiers'))
+        self.stats.bump('ssa.phis_inserted', inserted)
+        self.stats.bump('ssa.values', len(self.graph.ssa_values))
+        return inserted
+
+    def run_pass(self, name):
+        info = PASSES[name]
+        for analysis in info.requires:
+            self.analyses.get(analysis)
+        with self.stats.timer(name):
+            result = getattr(self, info.method)(self.graph, **info.options)
+        self.analyses.invalidate(preserved=info.preserves)
+        return result
+
+    def run_pipeline(self, spec=DEFAULT_PIPELINE):
+        names = parse_pipeline(spec) if isinstance(spec, str) else spec
+        return [(name, self.run_pass(name)) for name in names]
+
+    def dce(self, graph, aggressive=False):
+        if aggressive:
+            self.analyses.get('control-deps')
+            control_deps = graph.control_deps
+            ipdoms = graph.ipdoms
+
+        live = set()
+        live_blocks = set()
+        worklist = []
+
+        def mark(instr):
+            if instr is not None and instr not in live:
+                live.add(instr)
+                worklist.append(instr)
+
+        def mark_block(block):
+            if block not in live_blocks:
+                live_blocks.add(block)
+                for dep in control_deps[block]:
+                    mark(dep.terminator())
+
+        visited = 0
+        for block in graph.blocks:
+            visited += len(block.instr)
             for instr in block.instr:
+                if isinstance(instr, ReturnStmt):
+                    mark(instr)
+                elif isinstance(instr, IfStmt):
+                    if not aggressive or ipdoms.get(block) in (None, EXIT):
+                        mark(instr)
+
+        iterations = 0
+        while worklist:
+            instr = worklist.pop()
+            iterations += 1
+            for val in instr.uses():
+                if isinstance(val, Value) and val.defn is not None:
+                    mark(val.defn)
+            if aggressive:
+                mark_block(graph.block_of(instr))
                 if isinstance(instr, PhiNode):
-                    const_vals = set()
-                    for val, pred in instr.incoming:
-                        if pred in executable_blocks:
-                            const_vals.add(lattice[val] if isinstance(val, str) else val)
-                    if len(const_vals) == 1:
-                        const_val = const_vals.pop()
-                        new_instr.append(Var(instr.name, const_val))
-                        for b in blocks:
-                            for u in b.instr:
-                                u.replace_uses(instr.name, const_val)
-                    else:
-                        new_instr.append(instr)
+                    for _, pred in instr.incoming:
+                        mark_block(pred)
+                        if isinstance(pred.terminator(), IfStmt):
+                            mark(pred.terminator())
+
+        branches = 0
+        if aggressive:
+            for block in graph.blocks:
+                branch = block.terminator()
+                if isinstance(branch, IfStmt) and branch not in live:
+                    branches += 1
+                    target = ipdoms[block]
+                    for succ in list(block.succ):
+                        for instr in succ.instr:
+                            if isinstance(instr, PhiNode):
+                                instr.remove_incoming(block)
+                        graph.remove_edge(block, succ)
+                    goto = GotoStmt(target.name)
+                    graph.replace_instr(branch, goto)
+                    graph.add_edge(block, target)
+
+        removed = 0
+        for block in graph.blocks:
+            keep = []
+            for instr in block.instr:
+                if instr in live or isinstance(instr, GotoStmt):
+                    keep.append(instr)
                 else:
-                    new_instr.append(instr)
-            block.instr = new_instr
+                    graph.forget_instr(instr)
+                    removed += 1
+            block.instr = keep
+
+        stats = self.stats
+        stats.bump('dce.instructions_visited', visited)
+        stats.bump('dce.worklist_iterations', iterations)
+        stats.bump('dce.branches_removed', branches)
+        stats.bump('dce.removed', removed)
+        return removed
 
     def sccp(self, graph):
-        lattice = self.init_lattice(graph)
+        # Wegman, Zadeck: "Constant Propagation with Conditional Branches"
+        values = graph.ssa_values
+        state = bytearray(len(values))
+        consts = [None] * len(values)
+        for value in values:
+            if value.defn is None:
+                state[value.id] = BOTTOM
+
+        label_to_block = {b.name: b for b in graph.blocks}
         executable_blocks = set()
-        worklist_blocks = [graph.start]
-        worklist_values = list(lattice.keys())
-
-        while worklist_blocks or worklist_values:
-            while worklist_blocks:
-                block = worklist_blocks.pop()
+        executable_edges = set()
+        flow_worklist = [(None, graph.start)]
+        ssa_worklist = []
+
+        def evaluate(expr):
+            if isinstance(expr, Value):
+                return state[expr.id], consts[expr.id]
+            if isinstance(expr, (int, float)):
+                return CONST, expr
+            if isinstance(expr, BinOp):
+                lhs_state, lhs = evaluate(expr.lhs)
+                if lhs_state == BOTTOM:
+                    return BOTTOM, None
+                rhs_state, rhs = evaluate(expr.rhs)
+                if rhs_state == BOTTOM:
+                    return BOTTOM, None
+                if lhs_state == TOP or rhs_state == TOP:
+                    return TOP, None
+                try:
+                    return CONST, fold_binop(expr.op, lhs, rhs)
+                except (KeyError, ArithmeticError, TypeError):
+                    return BOTTOM, None
+            return BOTTOM, None
+
+        def update(value, new_state, new_const):
+            i = value.id
+            old_state = state[i]
+            if old_state == BOTTOM or new_state == TOP:
+                return
+            if old_state == CONST:
+                if new_state == CONST and consts[i] == new_const:
+                    return
+                new_state, new_const = BOTTOM, None
+            state[i] = new_state
+            consts[i] = new_const
+            ssa_worklist.append(value)
+
+        def visit_phi(phi, block):
+            merged, merged_const = TOP, None
+            for val, pred in phi.incoming:
+                if (pred, block) not in executable_edges:
+                    continue
+                val_state, val_const = evaluate(val)
+                if val_state == TOP:
+                    continue
+                if val_state == BOTTOM or (merged == CONST and merged_const != val_const):
+                    merged = BOTTOM
+                    break
+                merged, merged_const = CONST, val_const
+            update(phi.name, merged, merged_const)
+
+        def visit(instr, block):
+            if isinstance(instr, PhiNode):
+                visit_phi(instr, block)
+            elif isinstance(instr, Var):
+                if isinstance(instr.name, Value):
+                    update(instr.name, *evaluate(instr.val))
+            elif isinstance(instr, IfStmt):
+                cond_state, cond = evaluate(instr.condition)
+                then_block = label_to_block[instr.thengoto.goto]
+                else_block = label_to_block[instr.elsegoto.goto]
+                if cond_state == CONST:
+                    flow_worklist.append((block, then_block if cond else else_block))
+                elif cond_state == BOTTOM:
+                    flow_worklist.append((block, then_block))
+                    flow_worklist.append((block, else_block))
+            elif isinstance(instr, GotoStmt):
+                flow_worklist.append((block, label_to_block[instr.goto]))
+
+        edges = ssa_edges = visited = 0
+        while flow_worklist or ssa_worklist:
+            while flow_worklist:
+                edge = flow_worklist.pop()
+                if edge in executable_edges:
+                    continue
+                edges += 1
+                executable_edges.add(edge)
+                block = edge[1]
                 if block in executable_blocks:
+                    # not just the leading phis: rewrite_constants replaces
+                    # a constant phi with a Var in place
+                    for instr in block.instr:
+                        if not isinstance(instr, PhiNode):
+                            continue
+                        visited += 1
+                        visit_phi(instr, block)
                     continue
                 executable_blocks.add(block)
-
+                visited += len(block.instr)
                 for instr in block.instr:
-                    if isinstance(instr, Var):
-                        val = instr.val
-                        if isinstance(val, (int, float)):
-                            lattice[instr.name] = val
-                        elif isinstance(val, str) and lattice.get(val) not in ("top", None):
-                            lattice[instr.name] = lattice[val]
-                        elif isinstance(val, BinOp):
-                            lhs = lattice[val.lhs] if isinstance(val.lhs, str) else val.lhs
-                            rhs = lattice[val.rhs] if isinstance(val.rhs, str) else val.rhs
-                            if isinstance(lhs, (int, float)) and isinstance(rhs, (int, float)):
-                                if val.op == '+':
-                                    lattice[instr.name] = lhs + rhs
-                                elif val.op == '-':
-                                    lattice[instr.name] = lhs - rhs
-                                elif val.op == '*':
-                                    lattice[instr.name] = lhs * rhs
-                                elif val.op == '/':
-                                    lattice[instr.name] = lhs / rhs if rhs != 0 else "top"
-                                else:
-                                    lattice[instr.name] = "top"
-                            else:
-                                lattice[instr.name] = "top"
-
-
-
-                    elif isinstance(instr, PhiNode):
-
-                        const_vals = set()
-
-                        for val, pred in instr.incoming:
-                            if pred not in executable_blocks:
-                                continue
-
-                            v = lattice[val] if isinstance(val, str) else val
-
-                            if v != "top" and v is not None:
-                                const_vals.add(v)
-
-                        if len(const_vals) == 1:
-
-                            lattice[instr.name] = const_vals.pop()
-
-                        elif len(const_vals) == 0:
-
-                            lattice[instr.name] = "top"
-
-                        else:
-
-                            lattice[instr.name] = "top"
+                    visit(instr, block)
 
+            while ssa_worklist:
+                value = ssa_worklist.pop()
+                ssa_edges += 1
+                for user in graph.users_of(value):
+                    block = graph.block_of(user)
+                    if block in executable_blocks:
+                        visited += 1
+                        visit(user, block)
+
+        self.executable_blocks = executable_blocks
+        self.executable_edges = executable_edges
+        rewritten = self.rewrite_constants(graph, state, consts)
+
+        stats = self.stats
+        stats.bump('sccp.cfg_edges', edges)
+        stats.bump('sccp.ssa_edges', ssa_edges)
+        stats.bump('sccp.instructions_visited', visited)
+        stats.bump('sccp.values_rewritten', rewritten)
+        return rewritten
+
+    def rewrite_constants(self, graph, state, consts):
+        replacements = {}
+        rewritten = 0
+        for value in list(graph.ssa_values):
+            if state[value.id] != CONST:
+                continue
+            const = consts[value.id]
+            defn = value.defn
+            changed = graph.replace_all_uses(value, const)
+            if defn is not None and graph.block_of(defn) in self.executable_blocks:
+                if not (isinstance(defn, Var) and defn.val == const):
+                    replacements[defn] = Var(value, const)
+                    changed += 1
+            if changed:
+                rewritten += 1
+        graph.replace_instrs(replacements)
+        return rewritten
+
+    def gvn(self, graph):
+        # dominator-scoped value numbering: an expression is available in every
+        # block its first computation dominates. Copies and redundant
+        # expressions are forwarded to their leader and deleted.
+        domtree = graph.get_domtree()
+        available = {}
+        expressions = copies = redundant = phis = 0
+
+        def forward(instr, leader):
+            graph.replace_all_uses(instr.name, leader)
+            graph.forget_instr(instr)
+            dead.add(instr)
+
+        def dominates_block(value, block):
+            if not isinstance(value, Value):
+                return value != "undef"
+            defn = value.defn
+            return defn is not None and domtree.strictly_dominates(graph.block_of(defn), block)
+
+        stack = [(domtree.root, None)]
+        while stack:
+            block, scope = stack.pop()
+            if scope is not None:
+                for key in scope:
+                    del available[key]
+                continue
+            scope = []
+            dead = set()
+            for instr in block.instr:
+                if not isinstance(instr.name, Value):
+                    continue
+                if isinstance(instr, PhiNode):
+                    operands = set(operand_key(v) for v, _ in instr.incoming if v is not instr.name)
+                    if len(operands) == 1:
+                        leader = next(v for v, _ in instr.incoming if v is not instr.name)
+                        if dominates_block(leader, block):
+                            forward(instr, leader)
+                            phis += 1
+                            continue
+                    key = ('phi', block, tuple(sorted((operand_key(v), id(p)) for v, p in instr.incoming)))
+                elif isinstance(instr, Var):
+                    if instr.val is None:
+                        continue
+                    if not isinstance(instr.val, BinOp):
+                        forward(instr, instr.val)
+                        copies += 1
+                        continue
+                    key = expression_key(instr.val)
+                    expressions += 1
+                else:
+                    continue
+                leader = available.get(key)
+                if leader is not None:
+                    forward(instr, leader)
+                    redundant += 1
+                else:
+                    available[key] = instr.name
+                    scope.append(key)
+            if dead:
+                block.instr = [instr for instr in block.instr if instr not in dead]
+            stack.append((block, scope))
+            for child in reversed(domtree.children[block]):
+                stack.append((child, None))
+
+        stats = self.stats
+        stats.bump('gvn.expressions', expressions)
+        stats.bump('gvn.redundant', redundant)
+        stats.bump('gvn.copies', copies)
+        stats.bump('gvn.phis', phis)
+        return redundant + copies + phis
+
+    def preheader(self, graph, header, body, loops):
+        # the block control enters the loop from, made if needed by splitting
+        # the single entry edge; loops entered from several blocks are skipped
+        outside = [p for p in header.pred if p not in body]
+        if len(outside) != 1:
+            return None
+        pred = outside[0]
+        if len(pred.succ) == 1:
+            return pred
+
+        block = graph.split_edge(pred, header, f"{header.name}.pre")
+        for other in loops.values():
+            if pred in other:
+                other.add(block)
+        self.stats.bump('licm.preheaders')
+        return block
+
+    def licm(self, graph):
+        # hoist BinOp definitions whose operands are all defined outside the
+        # loop into its preheader, innermost loops first so that code moves
+        # outward through the whole nest. Expressions that can raise are only
+        # hoisted from blocks that run on every trip (dominate every exit).
+        loops = {header: set(body) for header, body in graph.loops.items()}
+        domtree = graph.get_domtree()
+        order = {block: i for i, block in enumerate(domtree.rpo)}
+        hoisted = 0
+
+        for header in sorted(loops, key=lambda h: len(loops[h])):
+            body = loops[header]
+            exiting = [b for b in body if any(s not in body for s in b.succ)]
+            invariant = []
+            hoistable = set()
+            for block in sorted(body, key=order.get):
+                guaranteed = all(domtree.dominates(block, e) for e in exiting)
+                for instr in block.instr:
+                    if not isinstance(instr, Var) or not isinstance(instr.val, BinOp):
+                        continue
+                    if not isinstance(instr.name, Value):
+                        continue
+                    if not guaranteed and self.may_trap(instr.val):
+                        continue
+                    if all(not isinstance(v, Value) or v.defn is None or v.defn in hoistable
+                           or graph.block_of(v.defn) not in body for v in instr.uses()):
+                        hoistable.add(instr)
+                        invariant.append(instr)
+            if not invariant:
+                continue
+            preheader = self.preheader(graph, header, body, loops)
+            if preheader is None:
+                continue
+            order.setdefault(preheader, order[header] - 0.5)
+            for instr in invariant:
+                graph.remove_instr(instr)
+                graph.insert_instr(preheader, len(preheader.instr) - 1, instr)
+            hoisted += len(invariant)
+
+        self.stats.bump('licm.hoisted', hoisted)
+        return hoisted
+
+    def may_trap(self, expr):
+        # division by zero, or arithmetic on a value that may be undefined
+        if isinstance(expr, Value):
+            defn = expr.defn
+            return isinstance(defn, PhiNode) and any(v == "undef" for v, _ in defn.incoming)
+        if not isinstance(expr, BinOp):
+            return expr == "undef"
+        return expr.op == '/' or self.may_trap(expr.lhs) or self.may_trap(expr.rhs)
+
+    def simplify_cfg(self, graph):
+        # fold branches on constant conditions (SCCP leaves its constant
+        # conditions as literals) and delete the blocks that become
+        # unreachable; thread jumps through blocks holding nothing but a
+        # goto, and merge a block into its only predecessor when it is that
+        # predecessor's only successor. Repeated until nothing changes.
+        # Deleting unreachable blocks and merging leave dominance alone, so
+        # a current dominator tree is patched instead of recomputed; folding
+        # and threading do not
+        domtree = graph.get_domtree() if graph.domtree_version == graph.shape_version else None
+        patch = domtree is not None
+        removed = set()
+        folded = threaded = merged = phis = 0
+
+        def retarget(pred, old, new):
+            # pred's edge to old now goes to new
+            pred.succ[pred.succ.index(old)] = new
+            branch = pred.terminator()
+            if branch is not None:
+                for goto in (branch.thengoto, branch.elsegoto) if isinstance(branch, IfStmt) else (branch,):
+                    if isinstance(goto, GotoStmt) and goto.goto == old.name:
+                        goto.goto = new.name
+
+        def drop_edge(block, succ):
+            block.succ.remove(succ)
+            succ.pred.remove(block)
+            if block not in succ.pred:
+                for instr in succ.instr:
+                    if isinstance(instr, PhiNode):
+                        instr.remove_incoming(block)
+
+        def drop_trivial_phis(block):
+            # a phi in a block with one predecessor is its operand
+            count = 0
+            for phi in [instr for instr in block.instr if isinstance(instr, PhiNode)]:
+                value = phi.incoming[0][0] if phi.incoming else "undef"
+                graph.remove_instr(phi)
+                if value is not phi.name:
+                    graph.replace_all_uses(phi.name, value)
+                count += 1
+            return count
+
+        def branch_target(block, branch):
+            # the successor a branch always takes, or None
+            then_block = next(b for b in block.succ if b.name == branch.thengoto.goto)
+            else_block = next(b for b in block.succ if b.name == branch.elsegoto.goto)
+            if then_block is else_block:
+                return then_block
+            cond = branch.condition
+            if isinstance(cond, Value):
+                cond = graph.get_const(cond)
+            elif isinstance(cond, BinOp) and all(isinstance(v, (int, float)) for v in (cond.lhs, cond.rhs)):
+                try:
+                    cond = fold_binop(cond.op, cond.lhs, cond.rhs)
+                except (KeyError, ArithmeticError, TypeError):
+                    return None
+            if not isinstance(cond, (int, float)):
+                return None
+            return then_block if cond else else_block
 
+        changed = True
+        while changed:
+            changed = False
 
-                    elif isinstance(instr, IfStmt):
-                        name_to_block = {b.name: b for b in graph.blocks}
+            for block in graph.blocks:
+                branch = block.terminator()
+                if not isinstance(branch, IfStmt):
+                    continue
+                target = branch_target(block, branch)
+                if target is None:
+                    continue
+                for succ in list(block.succ):
+                    if succ is not target:
+                        drop_edge(block, succ)
+                if block.succ.count(target) > 1:
+                    drop_edge(block, target)
+                graph.replace_instr(branch, GotoStmt(target.name))
+                folded += 1
+                patch = False
+                changed = True
+
+            for block in graph.blocks:
+                if block is graph.start or block in removed or len(block.instr) != 1:
+                    continue
+                if not isinstance(block.instr[0], GotoStmt) or len(block.succ) != 1:
+                    continue
+                target = block.succ[0]
+                if target is block:
+                    continue
+                incoming = [(phi, next(v for v, p in phi.incoming if p is block))
+                            for phi in target.instr if isinstance(phi, PhiNode)]
+                for pred in list(block.pred):
+                    if pred is block or pred in target.pred or pred.succ.count(block) != 1:
+                        continue
+                    retarget(pred, block, target)
+                    block.pred.remove(pred)
+                    target.pred.append(pred)
+                    for phi, value in incoming:
+                        phi.add_incoming(value, pred)
+                    threaded += 1
+                    patch = False
+                    changed = True
 
-                        then_block = name_to_block[instr.thengoto.goto]
-                        else_block = name_to_block[instr.elsegoto.goto]
+            reachable = {graph.start}
+            stack = [graph.start]
+            while stack:
+                for succ in stack.pop().succ:
+                    if succ not in reachable:
+                        reachable.add(succ)
+                        stack.append(succ)
+            for block in graph.blocks:
+                if block in reachable or block in removed:
+                    continue
+                for succ in list(block.succ):
+                    if succ in reachable:
+                        drop_edge(block, succ)
+                for instr in block.instr:
+                    graph.forget_instr(instr)
+                block.instr, block.pred, block.succ = [], [], []
+                removed.add(block)
+                if patch:
+                    domtree.remove(block)
+                changed = True
+
+            for block in graph.blocks:
+                if block in removed:
+                    continue
+                if len(block.pred) == 1:
+                    phis += drop_trivial_phis(block)
+                while len(block.succ) == 1:
+                    succ = block.succ[0]
+                    branch = block.terminator()
+                    if succ is block or succ is graph.start or len(succ.pred) != 1:
+                        break
+                    if branch is not None and not isinstance(branch, GotoStmt):
+                        break
+                    phis += drop_trivial_phis(succ)
+                    if branch is not None:
+                        graph.remove_instr(branch)
+                    for instr in succ.instr:
+                        graph.instr_block[instr] = block
+                    block.instr.extend(succ.instr)
+                    block.succ = succ.succ
+                    for after in block.succ:
+                        after.pred = [block if p is succ else p for p in after.pred]
+                        for instr in after.instr:
+                            if isinstance(instr, PhiNode):
+                                instr.incoming = [(v, block if p is succ else p) for v, p in instr.incoming]
+                    succ.instr, succ.pred, succ.succ = [], [], []
+                    removed.add(succ)
+                    if patch:
+                        domtree.remove(succ)
+                    merged += 1
+                    changed = True
 
-                        cond_val = self.eval_expr(instr.condition, lattice)
-                        if cond_val == 1:
-                            worklist_blocks.append(then_block)
-                        elif cond_val == 0: 
-                            worklist_blocks.append(else_block)
+            if removed:
+                graph.blocks[:] = [b for b in graph.blocks if b not in removed]
+
+        if folded or threaded or removed:
+            if patch:
+                domtree.rpo[:] = [b for b in domtree.rpo if b not in removed]
+            graph.mark_shape_changed(keep_dominators=patch)
+
+        stats = self.stats
+        stats.bump('simplifycfg.branches_folded', folded)
+        stats.bump('simplifycfg.jumps_threaded', threaded)
+        stats.bump('simplifycfg.blocks_merged', merged)
+        stats.bump('simplifycfg.blocks_removed', len(removed) - merged)
+        stats.bump('simplifycfg.phis_removed', phis)
+        return folded + threaded + len(removed)
+
+    def out_of_ssa(self, graph):
+        # leave SSA form: each phi becomes a copy at the end of every
+        # predecessor, after splitting the critical edges into phi blocks so
+        # that copies only run on their own edge. Phi results are first
+        # coalesced with the operands whose live ranges don't interfere with
+        # theirs; each congruence class is renamed to one value, and copies
+        # within a class vanish. The copies left on an edge are sequentialized,
+        # breaking cycles with a temporary. The result has no phis and uses
+        # values as ordinary variables, assigned more than once, so no SSA
+        # pass can run after it. Returns (copies inserted, copies coalesced).
+        # Dead phis go first: their copies could read inputs (version 0)
+        # the program never reads
+        live_phis = graph.live_phis()
+        dead = 0
+        for block in graph.blocks:
+            keep = [instr for instr in block.instr if not isinstance(instr, PhiNode) or instr in live_phis]
+            dead += len(block.instr) - len(keep)
+            block.instr = keep
+
+        split = 0
+        for block in list(graph.blocks):
+            if not any(isinstance(instr, PhiNode) for instr in block.instr):
+                continue
+            for pred in list(block.pred):
+                if len(pred.succ) > 1 and pred.succ.count(block) == 1:
+                    graph.split_edge(pred, block, f"{pred.name}.{block.name}")
+                    split += 1
+
+        domtree = graph.get_domtree()
+        live_in, live_out = graph.compute_value_liveness()
+        # only values that take part in a phi can end up sharing a name.
+        # Inputs (version 0) are read by name, so they keep theirs
+        candidates = set()
+        for block in graph.blocks:
+            for instr in block.instr:
+                if not isinstance(instr, PhiNode):
+                    continue
+                candidates.add(instr.name)
+                candidates.update(v for v, _ in instr.incoming if isinstance(v, Value) and v.version)
+
+        # live_at[v]: candidates live just after v is defined. In strict SSA
+        # two values interfere exactly when one is live where the other is
+        # defined; phis of one block are defined together and always count
+        # as interfering with each other
+        live_at = {}
+        covers = {}
+        for block in graph.blocks:
+            live = candidates & live_out[block]
+            phi_names = set()
+            for instr in reversed(block.instr):
+                if isinstance(instr, PhiNode):
+                    phi_names.add(instr.name)
+                    continue
+                value = defined_value(instr)
+                if value in candidates:
+                    live.discard(value)
+                    live_at[value] = set(live)
+                live.update(v for v in instr.uses() if v in candidates)
+            live -= phi_names
+            for name in phi_names & candidates:
+                live_at[name] = (live | phi_names) - {name}
+        for value, live in live_at.items():
+            for other in live:
+                covers.setdefault(other, []).append(value)
+
+        classes = {}
+
+        def coalesce(u, v):
+            cu = classes.setdefault(u, [u])
+            cv = classes.setdefault(v, [v])
+            if cu is cv:
+                return
+            if len(cu) < len(cv):
+                cu, cv = cv, cu
+            for value in cv:
+                for other in live_at.get(value, ()):
+                    if classes.get(other) is cu:
+                        return
+                for other in covers.get(value, ()):
+                    if classes.get(other) is cu:
+                        return
+            cu.extend(cv)
+            for value in cv:
+                classes[value] = cu
+
+        for block in domtree.rpo:
+            for instr in block.instr:
+                if not isinstance(instr, PhiNode):
+                    continue
+                for value, _ in instr.incoming:
+                    if value in candidates:
+                        coalesce(instr.name, value)
+
+        leader = {}
+        for members in {id(c): c for c in classes.values()}.values():
+            first = min(members, key=lambda v: v.id)
+            for value in members:
+                leader[value] = first
+
+        def rename(value):
+            return leader.get(value, value) if isinstance(value, Value) else value
+
+        versions = {}
+        for value in graph.ssa_values:
+            versions[value.var] = max(versions.get(value.var, 0), value.version)
+
+        def new_temp(value):
+            versions[value.var] += 1
+            return graph.ssa_values.new(value.var, versions[value.var])
+
+        inserted = coalesced = temps = 0
+        for block in graph.blocks:
+            block_phis = [instr for instr in block.instr if isinstance(instr, PhiNode)]
+            if block_phis:
+                for pred in block.pred:
+                    copies = []
+                    for phi in block_phis:
+                        dst = rename(phi.name)
+                        src = rename(next((v for v, p in phi.incoming if p is pred), "undef"))
+                        if src is dst:
+                            coalesced += 1
                         else:
-                            if then_block not in executable_blocks:
-                                worklist_blocks.append(then_block)
-                            if else_block not in executable_blocks:
-                                worklist_blocks.append(else_block)
-
-                    elif isinstance(instr, GotoStmt):
-                        name_to_block = {b.name: b for b in graph.blocks}
-                        target_block = name_to_block[instr.goto]
-                        if target_block not in executable_blocks:
-                            worklist_blocks.append(target_block)
-
-            while worklist_values:
-                val = worklist_values.pop()
-                graph.propogate(val, lattice[val], executable_blocks)
-                for user_instr in graph.ssa_users.get(val, []):
-                    block = next(b for b in graph.blocks if user_instr in b.instr)
-                    if block in executable_blocks:
-                        worklist_blocks.append(block)
-
-        self.replace_phi_with_const(graph.blocks, lattice, executable_blocks)
+                            copies.append((dst, src))
+                    moves = sequentialize_copies(copies, new_temp)
+                    temps += len(moves) - len(copies)
+                    inserted += len(moves)
+                    index = len(pred.instr) - (pred.terminator() is not None)
+                    pred.instr[index:index] = [Var(dst, src) for dst, src in moves]
+                block.instr = [instr for instr in block.instr if not isinstance(instr, PhiNode)]
+
+        for block in graph.blocks:
+            for instr in block.instr:
+                instr.map_uses(rename)
+                if isinstance(instr, Var):
+                    instr.name = rename(instr.name)
+
+        graph.left_ssa = True
+        self.stats.bump('out-of-ssa.dead_phis', dead)
+        self.stats.bump('out-of-ssa.split_edges', split)
+        self.stats.bump('out-of-ssa.copies', inserted)
+        self.stats.bump('out-of-ssa.coalesced', coalesced)
+        self.stats.bump('out-of-ssa.temps', temps)
+        return inserted, coalesced
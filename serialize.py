@@ -0,0 +1,417 @@
+import gc
+import marshal
+import mmap
+import struct
+import zlib
+from contextlib import contextmanager
+from ir import Var, BinOp, IfStmt, ReturnStmt, GotoStmt, PhiNode, BasicBlock, Value, ValueTable
+from cfg import CFG
+
+
+# binary form: MAGIC, a flags byte (COMPRESSED, LEFT_SSA), then
+# length-prefixed marshal frames: the value table, the block names, and one
+# frame per block. Frames are sliced straight out of the buffer, so a mmap'd
+# file loads without a copy unless it is compressed.
+MAGIC = b"IRC2"
+COMPRESSED = 1
+LEFT_SSA = 2
+FRAME = struct.Struct('<I')
+
+TEXT_HEADER = "ir 1"
+
+CHUNK_SIZE = 1 << 16
+
+# operand tags; plain ints, floats, strings and None are stored as-is
+VALUE, BINOP = 0, 1
+
+# instruction tags
+VAR, PHI, IF, GOTO, RETURN = range(5)
+
+
+@contextmanager
+def gc_paused():
+    # everything a load allocates stays alive, but the cyclic GC would still
+    # rescan the growing heap many times over; on big CFGs that is most of
+    # the load time
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def encode_operand(value):
+    if isinstance(value, Value):
+        return (VALUE, value.id)
+    if isinstance(value, BinOp):
+        return (BINOP, value.op, encode_operand(value.lhs), encode_operand(value.rhs))
+    return value
+
+
+def decode_operand(data, values):
+    if type(data) is not tuple:
+        return data
+    if data[0] == VALUE:
+        return values[data[1]]
+    return BinOp(decode_operand(data[2], values), decode_operand(data[3], values), data[1])
+
+
+def encode_instr(instr, index):
+    if isinstance(instr, PhiNode):
+        incoming = tuple((encode_operand(v), index[p]) for v, p in instr.incoming)
+        return (PHI, instr.var, encode_operand(instr.name), incoming)
+    if isinstance(instr, Var):
+        return (VAR, encode_operand(instr.name), encode_operand(instr.val))
+    if isinstance(instr, IfStmt):
+        return (IF, encode_operand(instr.condition), instr.thengoto.goto, instr.elsegoto.goto)
+    if isinstance(instr, GotoStmt):
+        return (GOTO, instr.goto)
+    if isinstance(instr, ReturnStmt):
+        return (RETURN, instr.base_name, encode_operand(instr.retval))
+    raise TypeError(f"Cannot serialize {type(instr).__name__}")
+
+
+def decode_instr(data, values, blocks):
+    tag = data[0]
+    if tag == PHI:
+        phi = PhiNode(data[1])
+        phi.name = decode_operand(data[2], values)
+        phi.incoming = [(decode_operand(v, values), blocks[p]) for v, p in data[3]]
+        instr = phi
+    elif tag == VAR:
+        instr = Var(decode_operand(data[1], values), decode_operand(data[2], values))
+    elif tag == IF:
+        instr = IfStmt(decode_operand(data[1], values), GotoStmt(data[2]), GotoStmt(data[3]))
+    elif tag == GOTO:
+        instr = GotoStmt(data[1])
+    elif tag == RETURN:
+        instr = ReturnStmt(data[1])
+        instr.retval = decode_operand(data[2], values)
+    else:
+        raise ValueError(f"Unknown instruction tag {tag}")
+    if isinstance(instr.name, Value):
+        instr.name.defn = instr
+    return instr
+
+
+def encode_block(block, index):
+    return (tuple(encode_instr(instr, index) for instr in block.instr),
+            tuple(index[p] for p in block.pred),
+            tuple(index[s] for s in block.succ))
+
+
+def encode_cfg(cfg):
+    index = {block: i for i, block in enumerate(cfg.blocks)}
+    values = tuple((v.var, v.version) for v in cfg.ssa_values)
+    names = tuple(block.name for block in cfg.blocks)
+    return (values, names, tuple(encode_block(block, index) for block in cfg.blocks))
+
+
+def build_cfg(values_data, names, blocks_data):
+    blocks = [BasicBlock(name, []) for name in names]
+    cfg = CFG(blocks)
+    for var, version in values_data:
+        cfg.ssa_values.new(var, version)
+    values = cfg.ssa_values
+    for block, (instrs, preds, succs) in zip(blocks, blocks_data):
+        block.instr = [decode_instr(instr, values, blocks) for instr in instrs]
+        block.pred = [blocks[i] for i in preds]
+        block.succ = [blocks[i] for i in succs]
+    cfg.variables = set(instr.name for block in blocks for instr in block.instr if isinstance(instr, Var))
+    return cfg
+
+
+def decode_cfg(data):
+    return build_cfg(*data)
+
+
+class ChunkedWriter:
+    # collects small writes and hands them to fh in CHUNK_SIZE pieces,
+    # optionally through a zlib stream
+    def __init__(self, fh, compress=False, level=6):
+        self.fh = fh
+        self.buffer = []
+        self.size = 0
+        self.compressor = zlib.compressobj(level) if compress else None
+
+    def write(self, data):
+        self.buffer.append(data)
+        self.size += len(data)
+        if self.size >= CHUNK_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        data = self.buffer[0][:0].join(self.buffer)
+        self.buffer = []
+        self.size = 0
+        if self.compressor is not None:
+            data = self.compressor.compress(data)
+        self.fh.write(data)
+
+    def close(self):
+        self.flush()
+        if self.compressor is not None:
+            self.fh.write(self.compressor.flush())
+
+
+def write_binary(cfg, fh, compress=False):
+    fh.write(MAGIC + bytes([(COMPRESSED if compress else 0) | (LEFT_SSA if cfg.left_ssa else 0)]))
+    out = ChunkedWriter(fh, compress)
+
+    def frame(obj):
+        data = marshal.dumps(obj)
+        out.write(FRAME.pack(len(data)))
+        out.write(data)
+
+    index = {block: i for i, block in enumerate(cfg.blocks)}
+    frame(tuple((v.var, v.version) for v in cfg.ssa_values))
+    frame(tuple(block.name for block in cfg.blocks))
+    for block in cfg.blocks:
+        frame(encode_block(block, index))
+    out.close()
+
+
+def read_binary(data):
+    with gc_paused():
+        return read_frames(data)
+
+
+def read_frames(data):
+    view = memoryview(data)
+    if bytes(view[:len(MAGIC)]) != MAGIC:
+        raise ValueError("Not a serialized CFG (bad magic)")
+    flags = view[len(MAGIC)]
+    body = view[len(MAGIC) + 1:]
+    try:
+        if flags & COMPRESSED:
+            body = memoryview(zlib.decompress(body))
+        frames = []
+        pos, end = 0, len(body)
+        while pos < end:
+            length, = FRAME.unpack_from(body, pos)
+            pos += FRAME.size
+            if pos + length > end:
+                raise EOFError("truncated frame")
+            frames.append(marshal.loads(body[pos:pos + length]))
+            pos += length
+        cfg = build_cfg(frames[0], frames[1], frames[2:])
+        cfg.left_ssa = bool(flags & LEFT_SSA)
+        return cfg
+    except (zlib.error, struct.error, EOFError, TypeError, IndexError) as e:
+        raise ValueError(f"Corrupt serialized CFG: {e}")
+
+
+class Buffer:
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(data)
+
+    def getvalue(self):
+        return self.parts[0][:0].join(self.parts) if self.parts else b""
+
+
+def dumps(cfg, compress=True):
+    out = Buffer()
+    write_binary(cfg, out, compress)
+    return out.getvalue()
+
+
+def loads(data):
+    return read_binary(data)
+
+
+# text form, one item per line:
+#   ir 1
+#   left-ssa                       (only after out-of-ssa)
+#   value <var> <version>          (ids are implicit, in order)
+#   block <name>
+#   pred <name>...  /  succ <name>...
+#   var <target> <expr>
+#   phi <var> <target> [<value> <pred>]...
+#   if <expr> <then> <else>  /  goto <label>  /  return <name> <operand>
+# Operands: $<id> is an SSA value, @<name> a plain name, None, or a number;
+# expressions are prefix lists like (+ $3 (* @x 2)).
+
+def format_operand(value):
+    if isinstance(value, Value):
+        return f"${value.id}"
+    if isinstance(value, str):
+        return f"@{value}"
+    if isinstance(value, BinOp):
+        return f"({value.op} {format_operand(value.lhs)} {format_operand(value.rhs)})"
+    return repr(value)
+
+
+def format_instr(instr):
+    if isinstance(instr, PhiNode):
+        incoming = " ".join(f"{format_operand(v)} {p.name}" for v, p in instr.incoming)
+        return f"phi {instr.var} {format_operand(instr.name)} {incoming}".rstrip()
+    if isinstance(instr, Var):
+        return f"var {format_operand(instr.name)} {format_operand(instr.val)}"
+    if isinstance(instr, IfStmt):
+        return f"if {format_operand(instr.condition)} {instr.thengoto.goto} {instr.elsegoto.goto}"
+    if isinstance(instr, GotoStmt):
+        return f"goto {instr.goto}"
+    if isinstance(instr, ReturnStmt):
+        return f"return {instr.base_name} {format_operand(instr.retval)}"
+    raise TypeError(f"Cannot serialize {type(instr).__name__}")
+
+
+def write_text(cfg, fh):
+    out = ChunkedWriter(fh)
+    out.write(TEXT_HEADER + "\n")
+    if cfg.left_ssa:
+        out.write("left-ssa\n")
+    out.write("".join(f"value {v.var} {v.version}\n" for v in cfg.ssa_values))
+    for block in cfg.blocks:
+        lines = [f"block {block.name}",
+                 " ".join(["pred"] + [p.name for p in block.pred]),
+                 " ".join(["succ"] + [s.name for s in block.succ])]
+        lines.extend(format_instr(instr) for instr in block.instr)
+        out.write("\n".join(lines) + "\n")
+    out.close()
+
+
+def dump_text(cfg):
+    out = Buffer()
+    write_text(cfg, out)
+    return out.getvalue()
+
+
+def tokenize_line(line):
+    return line.replace("(", " ( ").replace(")", " ) ").split()
+
+
+def parse_operand(tokens, pos, values):
+    token = tokens[pos]
+    if token == "(":
+        op = tokens[pos + 1]
+        lhs, pos = parse_operand(tokens, pos + 2, values)
+        rhs, pos = parse_operand(tokens, pos, values)
+        if tokens[pos] != ")":
+            raise ValueError(f"expected ')', got '{tokens[pos]}'")
+        return BinOp(lhs, rhs, op), pos + 1
+    if token[0] == "$":
+        return values[int(token[1:])], pos + 1
+    if token[0] == "@":
+        return token[1:], pos + 1
+    if token == "None":
+        return None, pos + 1
+    try:
+        return int(token), pos + 1
+    except ValueError:
+        return float(token), pos + 1
+
+
+def read_text(source):
+    with gc_paused():
+        return parse_text(source)
+
+
+def parse_text(source):
+    lines = source.splitlines() if isinstance(source, str) else (line.rstrip("\n") for line in source)
+    lines = iter(lines)
+    if next(lines, "").strip() != TEXT_HEADER:
+        raise ValueError(f"Not a textual CFG (expected '{TEXT_HEADER}')")
+
+    values = ValueTable()
+    blocks = []
+    by_name = {}
+    pending_phis = []
+    edges = []
+    block = None
+    left_ssa = False
+    for number, line in enumerate(lines, 2):
+        tokens = tokenize_line(line)
+        if not tokens:
+            continue
+        try:
+            kind = tokens[0]
+            if kind == "value":
+                values.new(tokens[1], int(tokens[2]))
+            elif kind == "left-ssa":
+                left_ssa = True
+            elif kind == "block":
+                block = by_name[tokens[1]] = BasicBlock(tokens[1], [])
+                blocks.append(block)
+            elif kind in ("pred", "succ"):
+                edges.append((block, kind, tokens[1:]))
+            elif kind == "var":
+                name, pos = parse_operand(tokens, 1, values)
+                val, _ = parse_operand(tokens, pos, values)
+                block.instr.append(Var(name, val))
+            elif kind == "phi":
+                phi = PhiNode(tokens[1])
+                phi.name, pos = parse_operand(tokens, 2, values)
+                incoming = []
+                while pos < len(tokens):
+                    val, pos = parse_operand(tokens, pos, values)
+                    incoming.append((val, tokens[pos]))
+                    pos += 1
+                pending_phis.append((phi, incoming))
+                block.instr.append(phi)
+            elif kind == "if":
+                condition, pos = parse_operand(tokens, 1, values)
+                block.instr.append(IfStmt(condition, GotoStmt(tokens[pos]), GotoStmt(tokens[pos + 1])))
+            elif kind == "goto":
+                block.instr.append(GotoStmt(tokens[1]))
+            elif kind == "return":
+                ret = ReturnStmt(tokens[1])
+                ret.retval, _ = parse_operand(tokens, 2, values)
+                block.instr.append(ret)
+            else:
+                raise ValueError(f"unknown item '{kind}'")
+        except (IndexError, KeyError, ValueError, AttributeError) as e:
+            raise ValueError(f"line {number}: {e}")
+
+    if not blocks:
+        raise ValueError("textual CFG has no blocks")
+    try:
+        for block, kind, names in edges:
+            setattr(block, kind, [by_name[name] for name in names])
+        for phi, incoming in pending_phis:
+            phi.incoming = [(val, by_name[name]) for val, name in incoming]
+    except KeyError as e:
+        raise ValueError(f"unknown block {e}")
+
+    for block in blocks:
+        for instr in block.instr:
+            if isinstance(instr.name, Value):
+                instr.name.defn = instr
+    cfg = CFG(blocks)
+    cfg.ssa_values = values
+    cfg.left_ssa = left_ssa
+    return cfg
+
+
+def is_serialized(path):
+    with open(path, 'rb') as f:
+        head = f.read(len(TEXT_HEADER) + 1)
+    return head.startswith(MAGIC) or head.rstrip(b"\r\n") == TEXT_HEADER.encode()
+
+
+def load(path):
+    # binary files are mapped rather than read; text files are parsed line by line
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) == MAGIC:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return read_binary(data)
+    with open(path, 'r') as f:
+        return read_text(f)
+
+
+def save(cfg, path, binary=None, compress=False):
+    if binary is None:
+        binary = path.endswith('.irb')
+    if binary:
+        with open(path, 'wb', buffering=CHUNK_SIZE) as f:
+            write_binary(cfg, f, compress)
+    else:
+        with open(path, 'w', buffering=CHUNK_SIZE) as f:
+            write_text(cfg, f)
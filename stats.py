@@ -0,0 +1,120 @@
+import json
+import time
+import tracemalloc
+from collections import Counter
+
+
+class Timer:
+    __slots__ = ('stats', 'name', 'wall', 'cpu')
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        if self.stats.memory:
+            tracemalloc.reset_peak()
+        self.cpu = time.process_time()
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        self.stats.record(self.name, wall, cpu)
+        return False
+
+
+class NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+class Stats:
+    enabled = True
+
+    def __init__(self, memory=False):
+        self.timers = {}
+        self.counters = Counter()
+        self.memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def timer(self, name):
+        return Timer(self, name)
+
+    def record(self, name, wall, cpu):
+        entry = self.timers.get(name)
+        if entry is None:
+            entry = self.timers[name] = {'wall': 0.0, 'cpu': 0.0, 'calls': 0}
+        entry['wall'] += wall
+        entry['cpu'] += cpu
+        entry['calls'] += 1
+        if self.memory:
+            _, peak = tracemalloc.get_traced_memory()
+            entry['peak_bytes'] = max(entry.get('peak_bytes', 0), peak)
+
+    def bump(self, name, count=1):
+        self.counters[name] += count
+
+    def merge(self, data):
+        for name, entry in data.get('timers', {}).items():
+            mine = self.timers.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+            for key, value in entry.items():
+                if key == 'peak_bytes':
+                    mine[key] = max(mine.get(key, 0), value)
+                else:
+                    mine[key] += value
+        self.counters.update(data.get('counters', {}))
+
+    def to_dict(self):
+        return {'timers': self.timers, 'counters': dict(self.counters)}
+
+    def write_json(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, sort_keys=True)
+            f.write("\n")
+
+    def format(self):
+        lines = ["===== Pass execution timing report ====="]
+        total = sum(entry['wall'] for entry in self.timers.values()) or 1.0
+        header = f"  {'wall (s)':>10} {'cpu (s)':>10} {'%':>6} {'calls':>6}"
+        if self.memory:
+            header += f" {'peak (KB)':>10}"
+        lines.append(header + "  name")
+        for name, entry in sorted(self.timers.items(), key=lambda item: -item[1]['wall']):
+            line = f"  {entry['wall']:>10.4f} {entry['cpu']:>10.4f} {entry['wall'] / total * 100:>6.1f} {entry['calls']:>6}"
+            if self.memory:
+                line += f" {entry.get('peak_bytes', 0) / 1024:>10.1f}"
+            lines.append(f"{line}  {name}")
+        if self.counters:
+            lines.append("")
+            lines.append("===== Statistics =====")
+            for name, count in sorted(self.counters.items()):
+                lines.append(f"  {count:>10}  {name}")
+        return "\n".join(lines)
+
+
+class NullStats:
+    enabled = False
+    memory = False
+
+    def timer(self, name):
+        return NULL_TIMER
+
+    def bump(self, name, count=1):
+        pass
+
+    def merge(self, data):
+        pass
+
+
+NULL_STATS = NullStats()
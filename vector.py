@@ -0,0 +1,144 @@
+from ir import Var, BinOp, IfStmt, ReturnStmt, GotoStmt, PhiNode, Value
+from dominance import reverse_postorder
+from engine import input_names
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def ufuncs():
+    return {
+        '+': np.add,
+        '-': np.subtract,
+        '*': np.multiply,
+        '/': np.true_divide,
+        '<': np.less,
+        '>': np.greater,
+        '<=': np.less_equal,
+        '>=': np.greater_equal,
+        '==': np.equal,
+        '!=': np.not_equal,
+    }
+
+
+COMPARISONS = frozenset(('<', '>', '<=', '>=', '==', '!='))
+
+
+class BatchEvaluator:
+    # Evaluates an SSA CFG over a batch of inputs at once: every SSA value is
+    # an array with one lane per record, blocks run under a boolean lane
+    # mask, IfStmt splits the mask and phis select with np.where on the
+    # incoming edge masks. Blocks are swept in RPO; lanes that take a back
+    # edge are picked up on the next sweep, so loops run until every lane
+    # has returned. Without back edges every block runs once, so values
+    # are stored unmasked; lanes outside the mask are never read.
+    #
+    # Integers are int64 lanes, so results match the scalar engine as long
+    # as no intermediate overflows int64. A division by zero in an active
+    # lane raises ZeroDivisionError like the scalar path; "undef" reads as 0.
+    def __init__(self, cfg):
+        if np is None:
+            raise ImportError("vectorized evaluation needs numpy")
+        self.cfg = cfg
+        self.ops = ufuncs()
+        self.blocks = {block.name: block for block in cfg.blocks}
+        self.rpo = reverse_postorder(cfg.start, lambda b: b.succ)
+        order = {block: i for i, block in enumerate(self.rpo)}
+        self.cyclic = any(order[succ] <= order[block] for block in self.rpo for succ in block.succ)
+        self.inputs = set(input_names(cfg))
+
+    def operand(self, value, env, inputs, mask=None):
+        if isinstance(value, Value):
+            if value in env:
+                return env[value]
+            if value.version == 0:
+                # dead phis may read a version 0 that isn't an input
+                return inputs[value.var] if value.var in self.inputs else 0
+            return 0
+        if isinstance(value, str):
+            return 0 if value == "undef" else inputs[value]
+        if isinstance(value, BinOp):
+            return self.expression(value, env, inputs, mask)
+        return value
+
+    def expression(self, expr, env, inputs, mask=None):
+        if not isinstance(expr, BinOp):
+            return self.operand(expr, env, inputs, mask)
+        # the mask goes down to nested divisions too, so a zero divisor only
+        # raises in the lanes that actually evaluate it
+        lhs = self.operand(expr.lhs, env, inputs, mask)
+        rhs = self.operand(expr.rhs, env, inputs, mask)
+        if expr.op == '/':
+            zero = np.equal(rhs, 0)
+            if mask is not None:
+                zero = zero & mask
+            if np.any(zero):
+                raise ZeroDivisionError("division by zero")
+        result = self.ops[expr.op](lhs, rhs)
+        if expr.op in COMPARISONS:
+            result = np.asarray(result).astype(np.int64)
+        return result
+
+    def edge(self, pred, succ, mask, env, inputs, pending):
+        if not mask.any():
+            return
+        updates = []
+        for instr in succ.instr:
+            if isinstance(instr, PhiNode):
+                value = next((v for v, p in instr.incoming if p is pred), "undef")
+                old = env.get(instr.name, 0)
+                updates.append((instr.name, np.where(mask, self.operand(value, env, inputs), old)))
+        for name, value in updates:
+            env[name] = value
+        pending[succ] = pending[succ] | mask if succ in pending else mask
+
+    def run_block(self, block, mask, env, inputs, pending, result):
+        for instr in block.instr:
+            if isinstance(instr, PhiNode):
+                continue
+            if isinstance(instr, Var):
+                value = self.expression(instr.val, env, inputs, mask)
+                if self.cyclic:
+                    value = np.where(mask, value, env.get(instr.name, 0))
+                env[instr.name] = value
+            elif isinstance(instr, ReturnStmt):
+                value = self.operand(instr.retval, env, inputs)
+                return np.where(mask, value, result)
+            elif isinstance(instr, IfStmt):
+                cond = np.not_equal(self.expression(instr.condition, env, inputs, mask), 0)
+                taken = mask & cond
+                self.edge(block, self.blocks[instr.thengoto.goto], taken, env, inputs, pending)
+                self.edge(block, self.blocks[instr.elsegoto.goto], mask & ~taken, env, inputs, pending)
+                return result
+            elif isinstance(instr, GotoStmt):
+                self.edge(block, self.blocks[instr.goto], mask, env, inputs, pending)
+                return result
+        if block.succ:
+            self.edge(block, block.succ[0], mask, env, inputs, pending)
+        return result
+
+    def __call__(self, inputs, size=None, max_sweeps=100000):
+        arrays = {name: np.asarray(value) for name, value in inputs.items()}
+        if size is None:
+            size = max((a.shape[0] for a in arrays.values() if a.ndim), default=1)
+        arrays = {name: np.broadcast_to(a, (size,)) for name, a in arrays.items()}
+
+        env = {}
+        pending = {self.cfg.start: np.ones(size, dtype=bool)}
+        result = np.zeros(size, dtype=np.int64)
+        with np.errstate(all='ignore'):
+            for _ in range(max_sweeps):
+                if not pending:
+                    return result
+                for block in self.rpo:
+                    mask = pending.pop(block, None)
+                    if mask is None or not mask.any():
+                        continue
+                    result = self.run_block(block, mask, env, arrays, pending, result)
+        raise RuntimeError(f"lanes still running after {max_sweeps} sweeps")
+
+
+def evaluate_batch(cfg, inputs, size=None):
+    return BatchEvaluator(cfg)(inputs, size)